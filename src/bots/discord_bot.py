@@ -2,6 +2,7 @@ import asyncio
 import json
 import logging
 import os
+from typing import Optional
 
 import aiohttp
 from discord import app_commands, Intents, Interaction, Attachment, Object, Embed, Color
@@ -30,6 +31,28 @@ intents.message_content = True
 bot = commands.Bot(command_prefix="/", intents=intents)
 
 
+# Shared HTTP session for Discord REST calls, so follow-ups reuse open connections
+_session: Optional[aiohttp.ClientSession] = None
+
+
+async def _get_session() -> aiohttp.ClientSession:
+    """Get the shared Discord REST HTTP session, creating it on first use."""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=50, keepalive_timeout=75)
+        )
+    return _session
+
+
+async def close_session():
+    """Close the shared Discord REST HTTP session."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
 def create_tracked_task(coro):
     """Create a task and add it to our set of tracked tasks."""
     task = asyncio.create_task(coro)
@@ -117,11 +140,16 @@ class ChartSayerCog(commands.Cog, name="Chart Sayer"):
                 config_path = "src/config/chart_config.json"
 
                 if user_id in self.user_configs:
-                    result = process_chart_with_gpt4o(
-                        image_path, config_path, user_config=self.user_configs[user_id]
+                    result = await asyncio.to_thread(
+                        process_chart_with_gpt4o,
+                        image_path,
+                        config_path,
+                        user_config=self.user_configs[user_id],
                     )
                 else:
-                    result = process_chart_with_gpt4o(image_path, config_path)
+                    result = await asyncio.to_thread(
+                        process_chart_with_gpt4o, image_path, config_path
+                    )
 
                 await interaction.followup.send(f"Analysis Result: {result}")
 
@@ -233,12 +261,15 @@ class ChartSayerCog(commands.Cog, name="Chart Sayer"):
 
         if user_id in self.user_configs:
 
-            result = process_chart_with_gpt4o(
-                image_path, config_path, user_config=self.user_configs[user_id]
+            result = await asyncio.to_thread(
+                process_chart_with_gpt4o,
+                image_path,
+                config_path,
+                user_config=self.user_configs[user_id],
             )
         else:
 
-            result = process_chart_with_gpt4o(image_path, config_path)
+            result = await asyncio.to_thread(process_chart_with_gpt4o, image_path, config_path)
 
         await ctx.send(f"Analysis Result: {result}")
 
@@ -371,9 +402,22 @@ async def shutdown_bot():
             logger.warning(f"Cancelling task that didn't complete: {task}")
             task.cancel()
 
+    await close_session()
+
     logger.info("Discord bot shutdown complete")
 
 
+async def start_client(config):
+    """Set up and start the Discord bot as an application client."""
+    await setup_bot()
+    return await start_bot()
+
+
+async def shutdown_client():
+    """Shut down the Discord bot application client."""
+    await shutdown_bot()
+
+
 async def setup_discord_webhook(public_key):
     """Set up configuration for Discord webhook interactions."""
     logger.info("Initializing Discord for webhook interactions")
@@ -473,11 +517,11 @@ async def handle_command(interaction_data):
         headers = {"Content-Type": "application/json"}
         payload = {"content": content}
 
-        async with aiohttp.ClientSession() as session:
-            async with session.patch(webhook_url, json=payload, headers=headers) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    logger.error(f"Error sending Discord response: {error_text}")
+        session = await _get_session()
+        async with session.patch(webhook_url, json=payload, headers=headers) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                logger.error(f"Error sending Discord response: {error_text}")
 
     except Exception as e:
         logger.error(f"Error handling command: {e}")
@@ -133,7 +133,7 @@ class TelegramBotManager:
             await photo_file.download_to_drive(image_path)
 
             config_path = "src/config/chart_config.json"
-            result = process_chart_with_gpt4o(image_path, config_path)
+            result = await asyncio.to_thread(process_chart_with_gpt4o, image_path, config_path)
 
             await update.message.reply_text(f"Analysis Result: {result}")
 
@@ -161,3 +161,19 @@ class TelegramBotManager:
 
 
 bot_manager = TelegramBotManager()
+
+
+async def start_client(config):
+    """Start the Telegram bot as an application client."""
+    telegram_config = config.get("telegram", {})
+
+    if telegram_config.get("webhook_mode", False):
+        webhook_url = telegram_config.get("webhook_url")
+        await bot_manager.start_bot(telegram_token, polling=False, webhook_url=webhook_url)
+    else:
+        await bot_manager.start_bot(telegram_token, polling=True)
+
+
+async def shutdown_client():
+    """Shut down the Telegram bot application client."""
+    await bot_manager.shutdown()
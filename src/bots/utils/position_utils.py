@@ -10,11 +10,12 @@ from src.positions.models import (
     PositionType,
     PlatformType,
 )
-from src.positions.service import PositionService
+from src.positions.service import get_position_service
 
 logger = logging.getLogger(__name__)
 
-position_service = PositionService()
+# The same instance the API uses, so the bots and the API share one position cache
+position_service = get_position_service()
 
 # Helper functions for interacting with positions
 
@@ -0,0 +1,13 @@
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict
+
+import orjson
+
+CONFIG_PATH = "src/config/chart_config.json"
+
+
+@lru_cache(maxsize=1)
+def get_config() -> Dict:
+    """Load the chart configuration, reading it from disk only once."""
+    return orjson.loads(Path(CONFIG_PATH).read_bytes())
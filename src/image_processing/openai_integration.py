@@ -1,10 +1,12 @@
 import base64
+import io
 import json
 import logging
 import os
 
 import openai
 from dotenv import load_dotenv
+from PIL import Image
 
 load_dotenv()
 
@@ -12,10 +14,19 @@ openai.api_key = os.getenv("OPENAI_API_KEY")
 
 logger = logging.getLogger(__name__)
 
+# GPT-4o tiles images at 512px, so anything beyond this just inflates the payload
+MAX_IMAGE_DIMENSION = 1536
+JPEG_QUALITY = 85
+
 
 def encode_image(image_path):
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode("utf-8")
+    """Downscale the image and re-encode it as a base64 JPEG."""
+    with Image.open(image_path) as image:
+        image.thumbnail((MAX_IMAGE_DIMENSION, MAX_IMAGE_DIMENSION), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True)
+
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
 
 
 def load_chart_config(config_path):
@@ -1,5 +1,5 @@
 import asyncio
-import json
+import importlib
 import logging
 import signal
 import sys
@@ -8,23 +8,25 @@ from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from fastapi import FastAPI
 
-from src.bots.discord_bot import setup_bot as setup_discord_bot
-from src.bots.discord_bot import shutdown_bot as shutdown_discord_bot
-from src.bots.discord_bot import start_bot as start_discord_bot
-from src.bots.telegram_bot import bot_manager, telegram_token
-from src.storage.redis_client import RedisClient
+# Environment variables are loaded before any application module reads them
+load_dotenv()
+
+from src.config.settings import get_config
+from src.market_data.price_service import close_session as close_price_session
+from src.positions.service import get_position_service
+from src.storage.redis_client import get_redis_client
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-load_dotenv()
-
-config_path = "src/config/chart_config.json"
-with open(config_path, "r") as file:
-    config = json.load(file)
-
 shutdown_event = asyncio.Event()
 
+# Bot modules are imported lazily so that only configured clients are loaded
+BOT_CLIENTS = {
+    "discord": "src.bots.discord_bot",
+    "telegram": "src.bots.telegram_bot",
+}
+
 
 def handle_shutdown_signal():
     logger.info("Shutdown signal received!")
@@ -43,39 +45,41 @@ async def lifespan(app: FastAPI):
     for sig in (signal.SIGINT, signal.SIGTERM):
         loop.add_signal_handler(sig, handle_shutdown_signal)
 
-    discord_tasks = []
+    await redis_client.warm_up()
+    # Shared with the bots, so the API and the bots use one position cache
+    app.state.position_service = get_position_service()
 
-    try:
+    app.state.config = config = get_config()
+    if "telegram" in config["clients"] and config.get("telegram", {}).get("webhook_mode", False):
+        from src.routes.telegram_routes import router as telegram_router
 
-        if "discord" in config["clients"]:
-            logger.info("Setting up Discord bot...")
-            await setup_discord_bot()
-            discord_tasks = await start_discord_bot()
-            logger.info("Discord bot started")
+        app.include_router(telegram_router)
 
-        if "telegram" in config["clients"]:
-            telegram_config = config.get("telegram", {})
+    clients = []
 
-            if telegram_config.get("webhook_mode", False):
-                webhook_url = telegram_config.get("webhook_url")
-                await bot_manager.start_bot(telegram_token, polling=False, webhook_url=webhook_url)
-            else:
-                await bot_manager.start_bot(telegram_token, polling=True)
+    try:
+        for name in config["clients"]:
+            if name not in BOT_CLIENTS:
+                logger.warning(f"Unknown client in configuration: {name}")
+                continue
+
+            logger.info(f"Starting {name} bot...")
+            client = importlib.import_module(BOT_CLIENTS[name])
+            clients.append(client)
+            await client.start_client(config)
+            logger.info(f"{name.capitalize()} bot started")
 
         yield
     finally:
         logger.info("Application shutdown initiated...")
 
-        shutdown_tasks = []
-
-        if "discord" in config["clients"]:
-            shutdown_tasks.append(shutdown_discord_bot())
+        if clients:
+            await asyncio.gather(
+                *(client.shutdown_client() for client in clients), return_exceptions=True
+            )
 
-        if "telegram" in config["clients"]:
-            await bot_manager.shutdown()
-
-        if shutdown_tasks:
-            await asyncio.gather(*shutdown_tasks, return_exceptions=True)
+        await close_price_session()
+        await redis_client.close()
 
         logger.info("Application shutdown complete")
 
@@ -83,12 +87,7 @@ async def lifespan(app: FastAPI):
 app = FastAPI(lifespan=lifespan)
 
 # Initialize Redis client
-redis_client = RedisClient()
-
-if "telegram" in config["clients"] and config.get("telegram", {}).get("webhook_mode", False):
-    from src.routes.telegram_routes import router as telegram_router
-
-    app.include_router(telegram_router)
+redis_client = get_redis_client()
 
 # Include positions router
 from src.routes.positions.router import router as positions_router
@@ -104,4 +103,4 @@ async def read_root():
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools")
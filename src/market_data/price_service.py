@@ -2,24 +2,307 @@
 Market data service for fetching real-time price information.
 """
 
+import asyncio
 import logging
 import os
+import re
 import time
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 
 import aiohttp
+import orjson
+from cachetools import LRUCache, TTLCache
 from dotenv import load_dotenv
 
+from src.storage.redis_client import get_redis_client
+
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
 CMC_API_KEY = os.getenv("CMC_API_KEY", "")
+CMC_API_URL = "https://pro-api.coinmarketcap.com/v1/cryptocurrency"
 
 DEFAULT_CACHE_TTL = 300
+MIN_CACHE_TTL = 30
+LOCAL_CACHE_TTL = 5
+PRICE_CACHE_SIZE = 5000
+SYMBOL_ID_TTL = 24 * 60 * 60
+UNRESOLVED_SYMBOL_TTL = 10 * 60
+
+# Stored in place of an ID for symbols the CoinMarketCap ID map does not know
+UNRESOLVED_SYMBOL_ID = 0
+
+# Quote-currency suffixes stripped from trading pairs such as BTCUSDT
+_SUFFIX_RE = re.compile(r"(?:USDT|USDC|BUSD|USD)$")
+
+# Volatility is an EMA of the absolute 1h price change; at HIGH_VOLATILITY_PERCENT
+# a symbol's cached data is only trusted for MIN_CACHE_TTL seconds
+VOLATILITY_EMA_ALPHA = 0.3
+HIGH_VOLATILITY_PERCENT = 5.0
+
+# Prices are shared between workers through Redis for DEFAULT_CACHE_TTL seconds, with a
+# short-lived local cache in front of it to absorb bursts. Both map cache keys to
+# (price data, fetch time).
+_price_cache: TTLCache = TTLCache(maxsize=PRICE_CACHE_SIZE, ttl=LOCAL_CACHE_TTL)
+_volatility_ema: LRUCache = LRUCache(maxsize=PRICE_CACHE_SIZE)
+
+# CoinMarketCap IDs of symbols, since quotes are faster to look up by ID than by symbol
+_symbol_ids: TTLCache = TTLCache(maxsize=PRICE_CACHE_SIZE, ttl=SYMBOL_ID_TTL)
+
+# Symbols missing from the ID map, which are looked up by symbol without asking the map again
+_unresolved_symbols: TTLCache = TTLCache(maxsize=PRICE_CACHE_SIZE, ttl=UNRESOLVED_SYMBOL_TTL)
+
+# Fetches in progress, so that concurrent cache misses for the same symbols share one request
+_inflight: Dict[str, asyncio.Task] = {}
+
+redis_client = get_redis_client()
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+async def _get_session() -> aiohttp.ClientSession:
+    """Get the shared CoinMarketCap HTTP session, creating it on first use."""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300, keepalive_timeout=75),
+            timeout=aiohttp.ClientTimeout(total=10),
+            headers={"X-CMC_PRO_API_KEY": CMC_API_KEY},
+        )
+    return _session
+
+
+async def close_session():
+    """Close the shared CoinMarketCap HTTP session."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+def _get_price_key(cache_key: str) -> str:
+    """Get the Redis key for cached price data."""
+    return f"price:{cache_key}"
+
+
+async def _get_cached_prices(cache_keys: List[str], max_age_seconds: int) -> Dict[str, Dict]:
+    """Get cached price data younger than max_age_seconds, checking locally before Redis."""
+    cached = {}
+    remote_keys = []
+    now = time.time()
+
+    for cache_key in cache_keys:
+        entry = _price_cache.get(cache_key)
+        if entry and now - entry[1] < _adaptive_max_age(cache_key, max_age_seconds):
+            cached[cache_key] = entry[0]
+        else:
+            remote_keys.append(cache_key)
+
+    if not remote_keys:
+        return cached
+
+    entries = await redis_client.mget_json([_get_price_key(key) for key in remote_keys])
+
+    for cache_key, entry in zip(remote_keys, entries):
+        if not entry:
+            continue
+
+        price_data, fetched_at = entry["data"], entry["fetched_at"]
+        _price_cache[cache_key] = (price_data, fetched_at)
+        if cache_key not in _volatility_ema:
+            _record_volatility(cache_key, price_data)
 
-_price_cache: Dict[str, Any] = {}
-_last_update_time: Dict[str, Any] = {}
+        if now - fetched_at < _adaptive_max_age(cache_key, max_age_seconds):
+            cached[cache_key] = price_data
+
+    return cached
+
+
+async def _get_cached_price(cache_key: str, max_age_seconds: int) -> Optional[Dict]:
+    """Get cached price data if it is younger than max_age_seconds."""
+    cached = await _get_cached_prices([cache_key], max_age_seconds)
+    return cached.get(cache_key)
+
+
+async def _cache_prices(prices: Dict[str, Dict]) -> None:
+    """Store price data locally and in Redis, and update each symbol's volatility."""
+    fetched_at = time.time()
+
+    for cache_key, price_data in prices.items():
+        _price_cache[cache_key] = (price_data, fetched_at)
+        _record_volatility(cache_key, price_data)
+
+    await redis_client.mset_json(
+        {
+            _get_price_key(cache_key): {"data": price_data, "fetched_at": fetched_at}
+            for cache_key, price_data in prices.items()
+        },
+        ttl=DEFAULT_CACHE_TTL,
+    )
+
+
+async def _cache_price(cache_key: str, price_data: Dict) -> None:
+    """Store price data in the cache."""
+    await _cache_prices({cache_key: price_data})
+
+
+def _record_volatility(cache_key: str, price_data: Dict) -> None:
+    """Update the volatility EMA of a symbol from its latest price data."""
+    change = abs(price_data.get("percent_change_1h") or 0.0)
+    previous = _volatility_ema.get(cache_key)
+    if previous is None:
+        _volatility_ema[cache_key] = change
+    else:
+        _volatility_ema[cache_key] = (
+            VOLATILITY_EMA_ALPHA * change + (1 - VOLATILITY_EMA_ALPHA) * previous
+        )
+
+
+def _adaptive_max_age(cache_key: str, max_age_seconds: int) -> float:
+    """Shorten the allowed age of cached data for volatile symbols."""
+    volatility = _volatility_ema.get(cache_key)
+    if volatility is None:
+        return max_age_seconds
+
+    scale = max(0.0, 1.0 - volatility / HIGH_VOLATILITY_PERCENT)
+    return min(max_age_seconds, max(MIN_CACHE_TTL, max_age_seconds * scale))
+
+
+def _get_symbol_id_key(symbol: str) -> str:
+    """Get the Redis key for the CoinMarketCap ID of a symbol."""
+    return f"cmc:id:{symbol}"
+
+
+async def _get_symbol_ids(symbols: List[str]) -> Dict[str, int]:
+    """Resolve symbols to CoinMarketCap IDs, looking up unknown symbols in the ID map."""
+    ids = {symbol: _symbol_ids[symbol] for symbol in symbols if symbol in _symbol_ids}
+    missing = [
+        symbol for symbol in symbols if symbol not in ids and symbol not in _unresolved_symbols
+    ]
+
+    if missing:
+        cached_ids = await redis_client.mget_json([_get_symbol_id_key(s) for s in missing])
+        for symbol, symbol_id in zip(missing, cached_ids):
+            if symbol_id == UNRESOLVED_SYMBOL_ID:
+                _unresolved_symbols[symbol] = True
+            elif symbol_id is not None:
+                ids[symbol] = _symbol_ids[symbol] = symbol_id
+        missing = [
+            symbol for symbol in missing if symbol not in ids and symbol not in _unresolved_symbols
+        ]
+
+    if not missing:
+        return ids
+
+    session = await _get_session()
+    async with session.get(f"{CMC_API_URL}/map", params={"symbol": ",".join(missing)}) as response:
+        if response.status != 200:
+            error_text = await response.text()
+            logger.warning("Error resolving CoinMarketCap IDs: %s", error_text)
+            return ids
+
+        data = orjson.loads(await response.read())
+
+    # Several coins can share a symbol; the best ranked one is what a symbol lookup returns
+    resolved = {}
+    for entry in sorted(data.get("data", []), key=lambda e: e.get("rank") or float("inf")):
+        if entry["symbol"] in missing and entry["symbol"] not in resolved:
+            resolved[entry["symbol"]] = entry["id"]
+
+    unresolved = [symbol for symbol in missing if symbol not in resolved]
+
+    ids.update(resolved)
+    _symbol_ids.update(resolved)
+    _unresolved_symbols.update(dict.fromkeys(unresolved, True))
+
+    # Unknown symbols are remembered briefly, so that typos don't query the map on every miss
+    await asyncio.gather(
+        redis_client.mset_json(
+            {_get_symbol_id_key(symbol): symbol_id for symbol, symbol_id in resolved.items()},
+            ttl=SYMBOL_ID_TTL,
+        ),
+        redis_client.mset_json(
+            {_get_symbol_id_key(symbol): UNRESOLVED_SYMBOL_ID for symbol in unresolved},
+            ttl=UNRESOLVED_SYMBOL_TTL,
+        ),
+    )
+
+    return ids
+
+
+async def _request_quotes(params: Dict[str, str]) -> Dict[str, Dict]:
+    """Request latest quotes from CoinMarketCap, returning the response data."""
+    session = await _get_session()
+    async with session.get(f"{CMC_API_URL}/quotes/latest", params=params) as response:
+        if response.status != 200:
+            error_text = await response.text()
+            logger.error("Error fetching price data: %s", error_text)
+            return {}
+
+        data = orjson.loads(await response.read())
+
+    return data.get("data", {})
+
+
+async def _fetch_prices(symbols: List[str], convert: str) -> Dict[str, Dict]:
+    """Fetch price data for symbols, by CoinMarketCap ID where it is known."""
+    ids = await _get_symbol_ids(symbols)
+    unresolved = [symbol for symbol in symbols if symbol not in ids]
+
+    requests = []
+    if ids:
+        requests.append(
+            _request_quotes({"id": ",".join(str(i) for i in ids.values()), "convert": convert})
+        )
+    if unresolved:
+        requests.append(_request_quotes({"symbol": ",".join(unresolved), "convert": convert}))
+
+    quotes = {}
+    for data in await asyncio.gather(*requests):
+        quotes.update(data)
+
+    prices = {}
+    for symbol in symbols:
+        # Quotes requested by ID are keyed by ID, the others by symbol
+        crypto_data = quotes.get(str(ids[symbol])) if symbol in ids else quotes.get(symbol)
+        if crypto_data is None:
+            continue
+
+        quote_data = crypto_data["quote"][convert]
+        prices[symbol] = {
+            "symbol": crypto_data["symbol"],
+            "name": crypto_data["name"],
+            "price": quote_data["price"],
+            "percent_change_1h": quote_data["percent_change_1h"],
+            "percent_change_24h": quote_data["percent_change_24h"],
+            "percent_change_7d": quote_data["percent_change_7d"],
+            "market_cap": quote_data["market_cap"],
+            "volume_24h": quote_data["volume_24h"],
+            "last_updated": quote_data["last_updated"],
+            "currency": convert,
+        }
+
+    return prices
+
+
+async def _fetch_and_cache_prices(symbols: List[str], convert: str) -> Dict[str, Dict]:
+    """Fetch price data for symbols and store it in the cache."""
+    prices = await _fetch_prices(symbols, convert)
+    await _cache_prices({f"{symbol}:{convert}": data for symbol, data in prices.items()})
+    return prices
+
+
+async def _single_flight(key: str, fetch: Callable[[], Awaitable[Dict]]) -> Dict:
+    """Run fetch, or wait for the result of the fetch already running for the same key."""
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(fetch())
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+
+    # Shielded so that a cancelled caller does not cancel the fetch for the others
+    return await asyncio.shield(task)
 
 
 async def get_crypto_price(
@@ -39,79 +322,34 @@ async def get_crypto_price(
     # Normalize symbol
     symbol = symbol.upper().strip()
 
-    # Remove common suffixes for better matching
-    for suffix in ["USD", "USDT", "USDC", "BUSD"]:
-        if symbol.endswith(suffix) and len(symbol) > len(suffix):
-            symbol = symbol[: -len(suffix)]
-            break
+    # Remove common suffixes for better matching, keeping symbols that are only a suffix
+    symbol = _SUFFIX_RE.sub("", symbol) or symbol
 
     # Check cache first
     cache_key = f"{symbol}:{convert}"
-    now = time.time()
 
-    if (
-        cache_key in _price_cache
-        and cache_key in _last_update_time
-        and now - _last_update_time[cache_key] < max_age_seconds
-    ):
-        logger.debug(f"Using cached price data for {symbol}")
-        return _price_cache[cache_key]
+    if (cached := await _get_cached_price(cache_key, max_age_seconds)) is not None:
+        logger.debug("Using cached price data for %s", symbol)
+        return cached
 
     # If no API key, return mock data for development
     if not CMC_API_KEY:
         logger.warning("No CoinMarketCap API key found, using mock data")
         mock_data = _get_mock_price_data(symbol, convert)
-        _price_cache[cache_key] = mock_data
-        _last_update_time[cache_key] = now
+        await _cache_price(cache_key, mock_data)
         return mock_data
 
     try:
-        # Fetch from CoinMarketCap API
-        url = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
-
-        params = {"symbol": symbol, "convert": convert}
+        # Fetch from CoinMarketCap API and update the cache
+        prices = await _single_flight(cache_key, lambda: _fetch_and_cache_prices([symbol], convert))
 
-        headers = {
-            "X-CMC_PRO_API_KEY": CMC_API_KEY,
-        }
+        if symbol not in prices:
+            logger.error("Symbol %s not found in response", symbol)
+            return None
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params, headers=headers) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    logger.error(f"Error fetching price data: {error_text}")
-                    return None
-
-                data = await response.json()
-
-                if "data" not in data or symbol not in data["data"]:
-                    logger.error(f"Symbol {symbol} not found in response")
-                    return None
-
-                # Extract relevant price data
-                crypto_data = data["data"][symbol]
-                quote_data = crypto_data["quote"][convert]
-
-                result = {
-                    "symbol": crypto_data["symbol"],
-                    "name": crypto_data["name"],
-                    "price": quote_data["price"],
-                    "percent_change_1h": quote_data["percent_change_1h"],
-                    "percent_change_24h": quote_data["percent_change_24h"],
-                    "percent_change_7d": quote_data["percent_change_7d"],
-                    "market_cap": quote_data["market_cap"],
-                    "volume_24h": quote_data["volume_24h"],
-                    "last_updated": quote_data["last_updated"],
-                    "currency": convert,
-                }
-
-                # Update cache
-                _price_cache[cache_key] = result
-                _last_update_time[cache_key] = now
-
-                return result
+        return prices[symbol]
     except Exception as e:
-        logger.error(f"Error fetching price data: {e}")
+        logger.error("Error fetching price data: %s", e)
         return None
 
 
@@ -134,15 +372,8 @@ async def get_multiple_crypto_prices(
     # If no API key, return mock data for development
     if not CMC_API_KEY:
         logger.warning("No CoinMarketCap API key found, using mock data for multiple symbols")
-        result = {}
-        now = time.time()
-
-        for symbol in normalized_symbols:
-            cache_key = f"{symbol}:{convert}"
-            mock_data = _get_mock_price_data(symbol, convert)
-            _price_cache[cache_key] = mock_data
-            _last_update_time[cache_key] = now
-            result[symbol] = mock_data
+        result = {symbol: _get_mock_price_data(symbol, convert) for symbol in normalized_symbols}
+        await _cache_prices({f"{symbol}:{convert}": data for symbol, data in result.items()})
 
         return result
 
@@ -150,18 +381,14 @@ async def get_multiple_crypto_prices(
         # Check which symbols we need to fetch
         symbols_to_fetch = []
         result = {}
-        now = time.time()
 
-        for symbol in normalized_symbols:
-            cache_key = f"{symbol}:{convert}"
+        cache_keys = {symbol: f"{symbol}:{convert}" for symbol in normalized_symbols}
+        cached = await _get_cached_prices(list(cache_keys.values()), max_age_seconds)
 
-            if (
-                cache_key in _price_cache
-                and cache_key in _last_update_time
-                and now - _last_update_time[cache_key] < max_age_seconds
-            ):
+        for symbol, cache_key in cache_keys.items():
+            if cache_key in cached:
                 # Use cached data
-                result[symbol] = _price_cache[cache_key]
+                result[symbol] = cached[cache_key]
             else:
                 # Need to fetch this symbol
                 symbols_to_fetch.append(symbol)
@@ -170,61 +397,23 @@ async def get_multiple_crypto_prices(
             # All symbols were in cache
             return result
 
-        # Fetch from CoinMarketCap API
-        url = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
+        # Fetch from CoinMarketCap API and update the cache
+        symbols_to_fetch = sorted(set(symbols_to_fetch))
+        prices = await _single_flight(
+            f"{','.join(symbols_to_fetch)}:{convert}",
+            lambda: _fetch_and_cache_prices(symbols_to_fetch, convert),
+        )
 
-        params = {"symbol": ",".join(symbols_to_fetch), "convert": convert}
+        for symbol in symbols_to_fetch:
+            if symbol not in prices:
+                logger.warning("Symbol %s not found in API response", symbol)
+                continue
 
-        headers = {
-            "X-CMC_PRO_API_KEY": CMC_API_KEY,
-        }
+            result[symbol] = prices[symbol]
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params, headers=headers) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    logger.error(f"Error fetching multiple price data: {error_text}")
-
-                    # Return what we have from cache
-                    return result
-
-                data = await response.json()
-
-                if "data" not in data:
-                    logger.error("No data in response for multiple symbols")
-                    return result
-
-                # Process each symbol in the response
-                for symbol in symbols_to_fetch:
-                    if symbol not in data["data"]:
-                        logger.warning(f"Symbol {symbol} not found in API response")
-                        continue
-
-                    crypto_data = data["data"][symbol]
-                    quote_data = crypto_data["quote"][convert]
-
-                    symbol_result = {
-                        "symbol": crypto_data["symbol"],
-                        "name": crypto_data["name"],
-                        "price": quote_data["price"],
-                        "percent_change_1h": quote_data["percent_change_1h"],
-                        "percent_change_24h": quote_data["percent_change_24h"],
-                        "percent_change_7d": quote_data["percent_change_7d"],
-                        "market_cap": quote_data["market_cap"],
-                        "volume_24h": quote_data["volume_24h"],
-                        "last_updated": quote_data["last_updated"],
-                        "currency": convert,
-                    }
-
-                    # Update cache and result
-                    cache_key = f"{symbol}:{convert}"
-                    _price_cache[cache_key] = symbol_result
-                    _last_update_time[cache_key] = now
-                    result[symbol] = symbol_result
-
-                return result
+        return result
     except Exception as e:
-        logger.error(f"Error fetching multiple price data: {e}")
+        logger.error("Error fetching multiple price data: %s", e)
         return result  # Return whatever we have from cache
 
 
@@ -293,9 +482,14 @@ def _get_mock_price_data(symbol: str, convert: str) -> Dict:
     }
 
 
-def clear_price_cache():
-    """Clear the price cache."""
-    global _price_cache, _last_update_time
+async def clear_price_cache():
+    """Clear the price cache, both in-process and the entries shared through Redis."""
     _price_cache.clear()
-    _last_update_time.clear()
+    _volatility_ema.clear()
+    _symbol_ids.clear()
+    _unresolved_symbols.clear()
+
+    keys = await redis_client.keys(_get_price_key("*"))
+    keys += await redis_client.keys(_get_symbol_id_key("*"))
+    await redis_client.delete_many(keys)
     logger.info("Price cache cleared")
@@ -1,8 +1,9 @@
 from datetime import datetime
 from enum import Enum
-from typing import Dict, Optional
+from typing import Any, Callable, Dict, Optional, Set
 from uuid import UUID, uuid4
 
+import orjson
 from pydantic import BaseModel, Field, ConfigDict
 
 
@@ -28,6 +29,27 @@ class PositionType(str, Enum):
     SHORT = "short"
 
 
+# Position fields that are not flat values and are stored as JSON inside the Redis hash
+JSON_HASH_FIELDS = {"metadata"}
+
+# Converters from the string values written by Position.to_hash back to field values
+HASH_FIELD_PARSERS: Dict[str, Callable[[str], Any]] = {
+    "id": UUID,
+    "platform": PlatformType,
+    "type": PositionType,
+    "status": PositionStatus,
+    "entry_price": float,
+    "take_profit": float,
+    "stop_loss": float,
+    "quantity": float,
+    "leverage": float,
+    "created_at": datetime.fromisoformat,
+    "updated_at": datetime.fromisoformat,
+    "closed_at": datetime.fromisoformat,
+    "metadata": orjson.loads,
+}
+
+
 class Position(BaseModel):
     """Model representing a trading position."""
 
@@ -52,31 +74,66 @@ class Position(BaseModel):
 
     def update(self, **kwargs) -> None:
         """Update the position with the given values and update the updated_at timestamp."""
-        for key, value in kwargs.items():
-            if hasattr(self, key):
-                setattr(self, key, value)
-
-        self.updated_at = datetime.utcnow()
-
-        # Set closed_at if status is changed to CLOSED
-        if self.status == PositionStatus.CLOSED and not self.closed_at:
-            self.closed_at = datetime.utcnow()
+        self._apply_updates(kwargs, datetime.utcnow())
 
     def close(self, **kwargs) -> None:
         """Close the position."""
+        now = datetime.utcnow()
         self.status = PositionStatus.CLOSED
-        self.closed_at = datetime.utcnow()
-        self.update(**kwargs)
+        self.closed_at = now
+        self._apply_updates(kwargs, now)
 
     def stop(self) -> None:
         """Soft-delete the position."""
         self.status = PositionStatus.STOPPED
         self.updated_at = datetime.utcnow()
 
+    def _apply_updates(self, values: Dict, now: datetime) -> None:
+        """Set the given field values and stamp the change with a single timestamp."""
+        for key, value in values.items():
+            if hasattr(self, key):
+                setattr(self, key, value)
+
+        self.updated_at = now
+
+        # Set closed_at if status is changed to CLOSED
+        if self.status == PositionStatus.CLOSED and not self.closed_at:
+            self.closed_at = now
+
     def to_dict(self) -> Dict:
         """Convert the position to a dictionary."""
         return self.model_dump(mode="json")
 
+    def to_hash(self, include: Optional[Set[str]] = None) -> Dict[str, Optional[str]]:
+        """Convert the position to string values for a Redis hash.
+
+        Fields that are unset map to None so that they can be removed from the hash.
+        """
+        data = self.model_dump(mode="json", include=include)
+
+        return {
+            key: (
+                None
+                if value is None
+                else orjson.dumps(value).decode("utf-8") if key in JSON_HASH_FIELDS else str(value)
+            )
+            for key, value in data.items()
+        }
+
+    @classmethod
+    def from_hash(cls, data: Dict[str, str]) -> "Position":
+        """Create a position from the string values of a Redis hash.
+
+        The hash was written by to_hash, so values are converted directly and validation is skipped.
+        """
+        values = {
+            key: HASH_FIELD_PARSERS.get(key, str)(value)
+            for key, value in data.items()
+            if key in cls.model_fields
+        }
+
+        return cls.model_construct(**values)
+
 
 class PositionCreate(BaseModel):
     """Model for creating a new position."""
@@ -1,7 +1,11 @@
+import asyncio
 import logging
-from typing import List, Optional, Union
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple, Union
 from uuid import UUID
 
+from cachetools import LRUCache, TTLCache
+
 from src.positions.models import (
     Position,
     PositionCreate,
@@ -9,19 +13,34 @@ from src.positions.models import (
     PositionUpdate,
     PlatformType,
 )
-from src.storage.redis_client import RedisClient
+from src.storage.redis_client import RedisClient, get_redis_client
 
 logger = logging.getLogger(__name__)
 
+POSITION_CACHE_SIZE = 10_000
+POSITION_CACHE_TTL = 30
+
 
 class PositionRepository:
     """Repository for managing positions in Redis."""
 
-    def __init__(self, redis_client: Optional[RedisClient] = None, prefix: str = "position"):
+    def __init__(
+        self,
+        redis_client: Optional[RedisClient] = None,
+        prefix: str = "position",
+        cache_ttl: int = POSITION_CACHE_TTL,
+    ):
         """Initialize the repository with Redis client."""
-        self.redis = redis_client or RedisClient()
+        self.redis = redis_client or get_redis_client()
         self.prefix = prefix
 
+        # Validated positions are cached in-process so hot reads skip Redis and Pydantic
+        self._cache: TTLCache = TTLCache(maxsize=POSITION_CACHE_SIZE, ttl=cache_ttl)
+        self._cache_locks: Dict[str, asyncio.Lock] = {}
+
+        # Users whose positions are known to be indexed by status, so the check runs once
+        self._indexed_users: LRUCache = LRUCache(maxsize=POSITION_CACHE_SIZE)
+
     def _get_position_key(self, position_id: Union[UUID, str]) -> str:
         """Get the Redis key for a position."""
         return f"{self.prefix}:{position_id}"
@@ -30,32 +49,153 @@ class PositionRepository:
         """Get the Redis key for a user's positions set."""
         return f"{self.prefix}:user:{platform}:{user_id}"
 
-    async def create_position(self, position_data: PositionCreate) -> Position:
-        """Create a new position."""
-        position = Position(**position_data.model_dump())
+    def _get_user_status_key(
+        self, user_id: str, platform: PlatformType, status: PositionStatus
+    ) -> str:
+        """Get the Redis key for the set of a user's positions with the given status."""
+        return f"{self.prefix}:user:{platform}:{user_id}:{status.value}"
+
+    def _get_user_indexed_key(self, user_id: str, platform: PlatformType) -> str:
+        """Get the Redis key marking that a user's positions are indexed by status."""
+        return f"{self.prefix}:user:{platform}:{user_id}:indexed"
+
+    def _get_user_symbol_key(self, user_id: str, platform: PlatformType, symbol: str) -> str:
+        """Get the Redis key for the set of a user's active positions in a symbol."""
+        return f"{self.prefix}:user:{platform}:{user_id}:symbol:{symbol.upper()}"
+
+    async def _save_position(
+        self, position: Position, previous: Position, fields: Optional[Set[str]] = None
+    ) -> bool:
+        """Write the given fields of a position (all fields by default) to its existing hash.
+
+        If the status or symbol is written, the position is moved between the user's status
+        sets and symbol sets in the same round-trip.
+        """
+        hash_data = position.to_hash(include=fields)
+        mapping = {key: value for key, value in hash_data.items() if value is not None}
+        remove_fields = [key for key, value in hash_data.items() if value is None]
+
+        add_to: List[str] = []
+        remove_from: List[str] = []
+        user_id, platform = position.user_id, position.platform
+
+        if fields is None or fields & {"status", "symbol"}:
+            symbol_keys = {
+                self._get_user_symbol_key(user_id, platform, symbol)
+                for symbol in (previous.symbol, position.symbol)
+            }
+            if position.status == PositionStatus.ACTIVE:
+                symbol_key = self._get_user_symbol_key(user_id, platform, position.symbol)
+                add_to.append(symbol_key)
+                symbol_keys.discard(symbol_key)
+            remove_from.extend(symbol_keys)
+
+        if fields is None or "status" in fields:
+            add_to.append(self._get_user_status_key(user_id, platform, position.status))
+            remove_from.extend(
+                self._get_user_status_key(user_id, platform, status)
+                for status in PositionStatus
+                if status != position.status
+            )
 
-        # Save the position
         position_key = self._get_position_key(position.id)
-        await self.redis.set_json(position_key, position.model_dump(mode="json"))
-
-        # Add the position to the user's positions set
-        user_positions_key = self._get_user_positions_key(position.user_id, position.platform)
-        await self.redis.add_to_set(user_positions_key, str(position.id))
-
-        logger.info(
-            f"Created position {position.id} for user {position.user_id} on {position.platform}"
+        saved = await self.redis.update_hash_fields(
+            position_key, mapping, remove_fields, str(position.id), add_to, remove_from
         )
-        return position
+        self._cache.pop(str(position.id), None)
+        return saved
+
+    async def create_position(self, position_data: PositionCreate) -> Position:
+        """Create a new position."""
+        positions = await self.create_positions([position_data])
+        return positions[0]
+
+    async def create_positions(self, positions_data: List[PositionCreate]) -> List[Position]:
+        """Create multiple positions in a single MULTI/EXEC."""
+        positions = [Position(**position_data.model_dump()) for position_data in positions_data]
+
+        hashes: Dict[str, Dict[str, str]] = {}
+
+        # Users without any positions yet are marked indexed, so their first read skips the rebuild
+        new_users = await self._get_new_users({(p.user_id, p.platform) for p in positions})
+        for user_id, platform in new_users:
+            hashes[self._get_user_indexed_key(user_id, platform)] = self._indexed_marker()
+
+        set_members: Dict[str, List[str]] = {}
+        for position in positions:
+            position_id = str(position.id)
+            hashes[self._get_position_key(position.id)] = {
+                key: value for key, value in position.to_hash().items() if value is not None
+            }
+
+            # Index the position in the user's positions set, its status set and symbol set
+            user_keys = [
+                self._get_user_positions_key(position.user_id, position.platform),
+                self._get_user_status_key(position.user_id, position.platform, position.status),
+            ]
+            if position.status == PositionStatus.ACTIVE:
+                user_keys.append(
+                    self._get_user_symbol_key(position.user_id, position.platform, position.symbol)
+                )
+
+            for key in user_keys:
+                set_members.setdefault(key, []).append(position_id)
+
+        if positions and await self.redis.set_hashes_with_set_members(hashes, set_members):
+            for user in new_users:
+                self._indexed_users[user] = True
+
+        for position in positions:
+            logger.info(
+                "Created position %s for user %s on %s",
+                position.id,
+                position.user_id,
+                position.platform,
+            )
+        return positions
 
     async def get_position(self, position_id: Union[UUID, str]) -> Optional[Position]:
         """Get a position by ID."""
+        cache_key = str(position_id)
+        position = self._cache.get(cache_key)
+
+        if position is None:
+            # Only one caller loads a given position while the others wait for the cache
+            lock = self._cache_locks.setdefault(cache_key, asyncio.Lock())
+            try:
+                async with lock:
+                    position = self._cache.get(cache_key)
+                    if position is None:
+                        position = await self._load_position(position_id)
+                        if position is None:
+                            return None
+                        self._cache[cache_key] = position
+            finally:
+                self._cache_locks.pop(cache_key, None)
+
+        return position.model_copy(deep=True)
+
+    async def _load_position(self, position_id: Union[UUID, str]) -> Optional[Position]:
+        """Load a position from Redis."""
         position_key = self._get_position_key(position_id)
-        position_data = await self.redis.get_json(position_key)
+        position_data = await self.redis.get_hash(position_key)
+
+        if position_data:
+            return Position.from_hash(position_data)
 
-        if not position_data:
+        # Positions written before the hash layout are stored as JSON strings
+        legacy_data = await self.redis.get_json(position_key)
+
+        if not legacy_data:
             return None
 
-        return Position(**position_data)
+        position = Position(**legacy_data)
+        hash_data = position.to_hash()
+        mapping = {key: value for key, value in hash_data.items() if value is not None}
+        await self.redis.set_hash_fields(position_key, mapping, replace=True)
+
+        logger.info("Migrated position %s to the hash layout", position.id)
+        return position
 
     async def update_position(
         self, position_id: Union[UUID, str], update_data: PositionUpdate
@@ -67,13 +207,18 @@ class PositionRepository:
             return None
 
         # Update the position
-        position.update(**update_data.model_dump(exclude_unset=True))
-
-        # Save the updated position
-        position_key = self._get_position_key(position.id)
-        await self.redis.set_json(position_key, position.model_dump(mode="json"))
+        previous = position.model_copy()
+        changes = update_data.model_dump(exclude_unset=True)
+        position.update(**changes)
+
+        # Save only the fields that changed, unless the position was deleted in the meantime
+        fields = set(changes) | {"updated_at"}
+        if position.closed_at != previous.closed_at:
+            fields.add("closed_at")
+        if not await self._save_position(position, previous, fields):
+            return None
 
-        logger.info(f"Updated position {position.id} for user {position.user_id}")
+        logger.info("Updated position %s for user %s", position.id, position.user_id)
         return position
 
     async def stop_position(self, position_id: Union[UUID, str]) -> Optional[Position]:
@@ -84,13 +229,14 @@ class PositionRepository:
             return None
 
         # Stop the position
+        previous = position.model_copy()
         position.stop()
 
-        # Save the updated position
-        position_key = self._get_position_key(position.id)
-        await self.redis.set_json(position_key, position.model_dump(mode="json"))
+        # Save the updated fields, unless the position was deleted in the meantime
+        if not await self._save_position(position, previous, {"status", "updated_at"}):
+            return None
 
-        logger.info(f"Stopped position {position.id} for user {position.user_id}")
+        logger.info("Stopped position %s for user %s", position.id, position.user_id)
         return position
 
     async def close_position(self, position_id: Union[UUID, str], **kwargs) -> Optional[Position]:
@@ -101,13 +247,15 @@ class PositionRepository:
             return None
 
         # Close the position
+        previous = position.model_copy()
         position.close(**kwargs)
 
-        # Save the updated position
-        position_key = self._get_position_key(position.id)
-        await self.redis.set_json(position_key, position.model_dump(mode="json"))
+        # Save the updated fields, unless the position was deleted in the meantime
+        fields = {"status", "closed_at", "updated_at"} | (kwargs.keys() & Position.model_fields)
+        if not await self._save_position(position, previous, fields):
+            return None
 
-        logger.info(f"Closed position {position.id} for user {position.user_id}")
+        logger.info("Closed position %s for user %s", position.id, position.user_id)
         return position
 
     async def delete_position(self, position_id: Union[UUID, str]) -> bool:
@@ -117,29 +265,74 @@ class PositionRepository:
         if not position:
             return False
 
-        # Delete the position
-        position_key = self._get_position_key(position.id)
-        await self.redis.delete(position_key)
+        # Delete the position and remove it from the user's positions, status and symbol sets
+        user_keys = [
+            self._get_user_positions_key(position.user_id, position.platform),
+            self._get_user_symbol_key(position.user_id, position.platform, position.symbol),
+        ] + [
+            self._get_user_status_key(position.user_id, position.platform, status)
+            for status in PositionStatus
+        ]
+        deleted = await self.redis.delete_with_set_members(
+            self._get_position_key(position.id), {key: [str(position.id)] for key in user_keys}
+        )
 
-        # Remove from user's positions set
-        user_positions_key = self._get_user_positions_key(position.user_id, position.platform)
-        await self.redis.remove_from_set(user_positions_key, str(position.id))
+        self._cache.pop(str(position.id), None)
 
-        logger.info(f"Deleted position {position.id} for user {position.user_id}")
+        # The cached position may already have been deleted elsewhere
+        if not deleted:
+            return False
+
+        logger.info("Deleted position %s for user %s", position.id, position.user_id)
         return True
 
     async def get_user_positions(
         self, user_id: str, platform: PlatformType, include_stopped: bool = False
     ) -> List[Position]:
         """Get all positions for a user."""
-        user_positions_key = self._get_user_positions_key(user_id, platform)
-        position_ids = await self.redis.get_set_members(user_positions_key)
-
+        if include_stopped:
+            user_positions_key = self._get_user_positions_key(user_id, platform)
+            position_ids = await self.redis.get_set_members(user_positions_key)
+            return await self._get_positions(position_ids)
+
+        await self._ensure_status_sets(user_id, platform)
+
+        # Stopped positions are left out by Redis rather than loaded and filtered here
+        status_keys = [
+            self._get_user_status_key(user_id, platform, status)
+            for status in PositionStatus
+            if status != PositionStatus.STOPPED
+        ]
+        position_ids = await self.redis.get_sets_union(status_keys)
+        positions = await self._get_positions(position_ids)
+
+        # A position left in the wrong status set is still filtered by its stored status
+        return [p for p in positions if p.status != PositionStatus.STOPPED]
+
+    async def _get_positions(self, position_ids: Set[str]) -> List[Position]:
+        """Get multiple positions, reading the uncached ones in a single round-trip."""
         positions = []
+        uncached_ids = []
         for position_id in position_ids:
-            position = await self.get_position(position_id)
-            if position and (include_stopped or position.status != PositionStatus.STOPPED):
-                positions.append(position)
+            position = self._cache.get(position_id)
+            if position is None:
+                uncached_ids.append(position_id)
+            else:
+                positions.append(position.model_copy(deep=True))
+
+        position_keys = [self._get_position_key(position_id) for position_id in uncached_ids]
+        positions_data = await self.redis.get_hash_many(position_keys)
+
+        for position_id, position_data in zip(uncached_ids, positions_data):
+            if position_data:
+                position = Position.from_hash(position_data)
+                self._cache[position_id] = position
+                positions.append(position.model_copy(deep=True))
+            else:
+                # Falls back to the legacy JSON layout
+                position = await self.get_position(position_id)
+                if position:
+                    positions.append(position)
 
         return positions
 
@@ -147,5 +340,98 @@ class PositionRepository:
         self, user_id: str, platform: PlatformType
     ) -> List[Position]:
         """Get active positions for a user."""
-        positions = await self.get_user_positions(user_id, platform)
+        await self._ensure_status_sets(user_id, platform)
+
+        active_key = self._get_user_status_key(user_id, platform, PositionStatus.ACTIVE)
+        position_ids = await self.redis.get_set_members(active_key)
+        positions = await self._get_positions(position_ids)
+
+        # The status sets are an index, so the stored status has the final say
         return [p for p in positions if p.status == PositionStatus.ACTIVE]
+
+    async def get_user_active_position_by_symbol(
+        self, user_id: str, platform: PlatformType, symbol: str
+    ) -> Optional[Position]:
+        """Get a user's active position for a symbol through the symbol sets."""
+        await self._ensure_status_sets(user_id, platform)
+
+        symbol_key = self._get_user_symbol_key(user_id, platform, symbol)
+        position_ids = await self.redis.get_set_members(symbol_key)
+        positions = await self._get_positions(position_ids)
+
+        # With several active positions in a symbol, the oldest one is returned
+        active_positions = [
+            p
+            for p in positions
+            if p.status == PositionStatus.ACTIVE and p.symbol.upper() == symbol.upper()
+        ]
+        return min(active_positions, key=lambda p: p.created_at, default=None)
+
+    async def get_user_position_counts(
+        self, user_id: str, platform: PlatformType
+    ) -> Dict[PositionStatus, int]:
+        """Get the number of positions a user has in each status."""
+        await self._ensure_status_sets(user_id, platform)
+
+        status_keys = [
+            self._get_user_status_key(user_id, platform, status) for status in PositionStatus
+        ]
+        status_counts = await self.redis.get_set_sizes(status_keys)
+        return dict(zip(PositionStatus, status_counts))
+
+    async def _get_new_users(
+        self, users: Set[Tuple[str, PlatformType]]
+    ) -> List[Tuple[str, PlatformType]]:
+        """Get the users, among those not known to be indexed, who have no positions yet."""
+        users = [user for user in users if user not in self._indexed_users]
+        if not users:
+            return []
+
+        sizes = await self.redis.get_set_sizes(
+            [self._get_user_positions_key(user_id, platform) for user_id, platform in users]
+        )
+        return [user for user, size in zip(users, sizes) if size == 0]
+
+    @staticmethod
+    def _indexed_marker() -> Dict[str, str]:
+        """Get the fields of the marker hash recording that a user's positions are indexed."""
+        return {"indexed_at": datetime.utcnow().isoformat()}
+
+    async def _ensure_status_sets(self, user_id: str, platform: PlatformType) -> None:
+        """Index a user's positions by status once, the first time they are read."""
+        if (user_id, platform) in self._indexed_users:
+            return
+
+        # Positions created before the status sets existed have to be indexed first
+        if not await self.redis.exists(self._get_user_indexed_key(user_id, platform)):
+            await self._rebuild_status_sets(user_id, platform)
+
+        self._indexed_users[(user_id, platform)] = True
+
+    async def _rebuild_status_sets(self, user_id: str, platform: PlatformType) -> None:
+        """Add a user's stored positions to their status sets and symbol sets.
+
+        The sets are only added to and removed from, never replaced, so positions created while
+        the rebuild runs keep their index entries.
+        """
+        positions = await self.get_user_positions(user_id, platform, include_stopped=True)
+
+        added: Dict[str, List[str]] = {}
+        removed: Dict[str, List[str]] = {}
+        for p in positions:
+            position_id = str(p.id)
+            for status in PositionStatus:
+                sets = added if status == p.status else removed
+                status_key = self._get_user_status_key(user_id, platform, status)
+                sets.setdefault(status_key, []).append(position_id)
+
+            sets = added if p.status == PositionStatus.ACTIVE else removed
+            symbol_key = self._get_user_symbol_key(user_id, platform, p.symbol)
+            sets.setdefault(symbol_key, []).append(position_id)
+
+        if await self.redis.update_sets(added, removed):
+            await self.redis.set_hash_fields(
+                self._get_user_indexed_key(user_id, platform), self._indexed_marker()
+            )
+
+        logger.info("Rebuilt position status sets for user %s on %s", user_id, platform)
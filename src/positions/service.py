@@ -1,4 +1,5 @@
 import logging
+from functools import lru_cache
 from typing import Dict, List, Optional, Union
 from uuid import UUID
 
@@ -17,21 +18,8 @@ logger = logging.getLogger(__name__)
 class PositionService:
     """Service for managing positions."""
 
-    _instance = None
-    _initialized = False
-
-    def __new__(cls, *args, **kwargs):
-        if cls._instance is None:
-            cls._instance = super(PositionService, cls).__new__(cls)
-            cls._instance._initialized = False
-        return cls._instance
-
     def __init__(self, repository: Optional[PositionRepository] = None):
-        if self._initialized:
-            return
-
         self.repository = repository or PositionRepository()
-        self._initialized = True
 
     async def create_position(self, data: Union[Dict, PositionCreate]) -> Position:
         """Create a new position."""
@@ -42,6 +30,14 @@ class PositionService:
 
         return await self.repository.create_position(position_data)
 
+    async def create_positions(self, data: List[Union[Dict, PositionCreate]]) -> List[Position]:
+        """Create multiple positions at once."""
+        positions_data = [
+            PositionCreate(**item) if isinstance(item, dict) else item for item in data
+        ]
+
+        return await self.repository.create_positions(positions_data)
+
     async def get_position(self, position_id: Union[UUID, str]) -> Optional[Position]:
         """Get a position by ID."""
         return await self.repository.get_position(position_id)
@@ -89,6 +85,11 @@ class PositionService:
         status: PositionStatus = PositionStatus.ACTIVE,
     ) -> Optional[Position]:
         """Get a position for a user by symbol and status."""
+        if status == PositionStatus.ACTIVE:
+            return await self.repository.get_user_active_position_by_symbol(
+                user_id, platform, symbol
+            )
+
         positions = await self.get_user_positions(user_id, platform)
 
         for position in positions:
@@ -99,15 +100,17 @@ class PositionService:
 
     async def get_positions_summary(self, user_id: str, platform: PlatformType) -> Dict:
         """Get a summary of positions for a user."""
-        positions = await self.get_user_positions(user_id, platform, include_stopped=True)
-
-        active_count = sum(1 for p in positions if p.status == PositionStatus.ACTIVE)
-        closed_count = sum(1 for p in positions if p.status == PositionStatus.CLOSED)
-        stopped_count = sum(1 for p in positions if p.status == PositionStatus.STOPPED)
+        counts = await self.repository.get_user_position_counts(user_id, platform)
 
         return {
-            "total": len(positions),
-            "active": active_count,
-            "closed": closed_count,
-            "stopped": stopped_count,
+            "total": sum(counts.values()),
+            "active": counts[PositionStatus.ACTIVE],
+            "closed": counts[PositionStatus.CLOSED],
+            "stopped": counts[PositionStatus.STOPPED],
         }
+
+
+@lru_cache(maxsize=1)
+def get_position_service() -> PositionService:
+    """Get the process-wide PositionService, creating it on first use."""
+    return PositionService()
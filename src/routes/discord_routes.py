@@ -14,8 +14,8 @@ router = APIRouter(prefix="/discord", tags=["discord"])
 async def discord_interactions(request: Request):
     """Handle incoming interactions from Discord."""
     try:
-        # Get configuration
-        from src.main import config
+        # Get the configuration loaded at startup
+        config = request.app.state.config
 
         discord_config = config.get("discord", {})
         public_key = discord_config.get("public_key")
@@ -32,7 +32,7 @@ async def discord_interactions(request: Request):
 
         # Get the interaction data
         data = await request.json()
-        logger.debug(f"Received Discord interaction: {data}")
+        logger.debug("Received Discord interaction: %s", data)
 
         # Process the interaction
         response_data = await process_discord_interaction(data)
@@ -43,5 +43,5 @@ async def discord_interactions(request: Request):
         logger.error("Invalid JSON in Discord interaction request")
         raise HTTPException(status_code=400, detail="Invalid JSON")
     except Exception as e:
-        logger.error(f"Error processing Discord interaction: {e}")
+        logger.error("Error processing Discord interaction: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
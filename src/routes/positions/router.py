@@ -1,7 +1,7 @@
 from typing import List
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request
 
 from src.positions.models import (
     Position,
@@ -9,14 +9,20 @@ from src.positions.models import (
     PositionUpdate,
     PlatformType,
 )
+from src.positions import service as position_service
 from src.positions.service import PositionService
 
 router = APIRouter(prefix="/positions", tags=["positions"])
 
 
-async def get_position_service() -> PositionService:
-    """Dependency to get the position service."""
-    return PositionService()
+# Keep this async: FastAPI runs sync dependencies in its threadpool on every request
+async def get_position_service(request: Request) -> PositionService:
+    """Dependency to get the application's shared position service."""
+    state = request.app.state
+    # Apps mounting this router without the main lifespan get the process-wide one
+    if getattr(state, "position_service", None) is None:
+        state.position_service = position_service.get_position_service()
+    return state.position_service
 
 
 @router.post("/", response_model=Position, status_code=201)
@@ -28,6 +34,15 @@ async def create_position(
     return await service.create_position(position)
 
 
+@router.post("/bulk", response_model=List[Position], status_code=201)
+async def create_positions(
+    positions: List[PositionCreate],
+    service: PositionService = Depends(get_position_service),
+):
+    """Create multiple positions at once."""
+    return await service.create_positions(positions)
+
+
 @router.get("/{position_id}", response_model=Position)
 async def get_position(
     position_id: UUID = Path(..., title="The ID of the position to get"),
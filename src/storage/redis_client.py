@@ -1,141 +1,391 @@
-import json
+import asyncio
 import logging
 import os
-from typing import Any, Dict, List, Optional, Set, Union
-from uuid import UUID
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set
 
-from dotenv import load_dotenv
+import orjson
 
 import redis.asyncio as redis
-from redis.asyncio.connection import ConnectionPool
-from redis.exceptions import RedisError
+from redis.asyncio.connection import BlockingConnectionPool, ConnectionPool
+from redis.exceptions import RedisError, ResponseError
 
 logger = logging.getLogger(__name__)
 
-load_dotenv()
+DEFAULT_REDIS_URL = "redis://localhost:6379/0"
 
+# Upper bound on concurrent GETs when a multi-key read has to be split up
+MAX_CONCURRENT_READS = 32
 
-class UUIDEncoder(json.JSONEncoder):
-    """Custom JSON encoder that handles UUID objects."""
+# Number of keys Redis examines per SCAN call
+SCAN_COUNT = 500
 
-    def default(self, obj):
-        if isinstance(obj, UUID):
-            return str(obj)
-        return super().default(obj)
+# The pool is bounded, and callers waiting for a free connection give up after the timeout.
+# The defaults can be overridden with REDIS_POOL_SIZE and REDIS_POOL_TIMEOUT.
+DEFAULT_POOL_SIZE = 50
+DEFAULT_POOL_TIMEOUT = 2.0
+SOCKET_TIMEOUT = 2.0
+HEALTH_CHECK_INTERVAL = 30
 
+# Connections opened at startup so early requests don't pay for the connection handshake,
+# overridable with REDIS_WARM_CONNECTIONS
+DEFAULT_WARM_CONNECTIONS = 10
 
-class RedisClient:
-    """Redis client for managing positions and other data."""
-
-    _instance = None
-    _initialized = False
-    _pool: Optional[ConnectionPool] = None
+# Sets and removes hash fields only if the hash exists, so a deleted key is never recreated,
+# and moves a member into the sets after the hash key and out of the sets after those.
+# ARGV holds the set member, the number of sets to add it to, the number of field/value pairs,
+# the pairs, then the fields to remove.
+UPDATE_HASH_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local add_end = 1 + tonumber(ARGV[2])
+local pairs_end = 3 + 2 * tonumber(ARGV[3])
+if pairs_end > 3 then
+    redis.call('HSET', KEYS[1], unpack(ARGV, 4, pairs_end))
+end
+if #ARGV > pairs_end then
+    redis.call('HDEL', KEYS[1], unpack(ARGV, pairs_end + 1))
+end
+for i = add_end + 1, #KEYS do
+    redis.call('SREM', KEYS[i], ARGV[1])
+end
+for i = 2, add_end do
+    redis.call('SADD', KEYS[i], ARGV[1])
+end
+return 1
+"""
 
-    def __new__(cls, *args, **kwargs):
-        if cls._instance is None:
-            cls._instance = super(RedisClient, cls).__new__(cls)
-            cls._instance._initialized = False
-        return cls._instance
 
-    def __init__(self, redis_url: str = None):
-        if self._initialized:
-            return
+class RedisClient:
+    """Redis client for managing positions and other data."""
 
+    def __init__(self, redis_url: Optional[str] = None):
         # Get Redis URL from environment variable or use default
-        redis_url = redis_url or os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        redis_url = redis_url or os.getenv("REDIS_URL", DEFAULT_REDIS_URL)
 
-        self.pool: ConnectionPool = ConnectionPool.from_url(redis_url)
-        self._initialized = True
+        # Responses are decoded by the parser, so every method works with str values. RESP3
+        # replies are typed, which the hiredis parser turns into Python objects in C.
+        self.pool: ConnectionPool = BlockingConnectionPool.from_url(
+            redis_url,
+            protocol=3,
+            max_connections=int(os.getenv("REDIS_POOL_SIZE", DEFAULT_POOL_SIZE)),
+            timeout=float(os.getenv("REDIS_POOL_TIMEOUT", DEFAULT_POOL_TIMEOUT)),
+            socket_timeout=SOCKET_TIMEOUT,
+            socket_keepalive=True,
+            health_check_interval=HEALTH_CHECK_INTERVAL,
+            decode_responses=True,
+        )
+        self.redis: redis.Redis = redis.Redis(connection_pool=self.pool)
+        self._update_hash_script = self.redis.register_script(UPDATE_HASH_SCRIPT)
 
         # Log a sanitized version of the URL (without credentials if any)
-        sanitized_url = redis_url
-        if "@" in redis_url:
-            sanitized_url = redis_url.split("@")[-1]
-            sanitized_url = f"redis://****:****@{sanitized_url}"
+        if logger.isEnabledFor(logging.INFO):
+            sanitized_url = redis_url
+            if "@" in redis_url:
+                sanitized_url = "redis://****:****@" + redis_url.split("@")[-1]
 
-        logger.info(f"Redis client initialized with URL: {sanitized_url}")
+            logger.info("Redis client initialized with URL: %s", sanitized_url)
+
+    async def warm_up(self, connections: Optional[int] = None) -> bool:
+        """Open pooled connections ahead of time with concurrent PINGs."""
+        if connections is None:
+            connections = int(os.getenv("REDIS_WARM_CONNECTIONS", DEFAULT_WARM_CONNECTIONS))
+        connections = min(connections, self.pool.max_connections)
+
+        try:
+            # Each concurrent command checks out its own connection from the pool
+            await asyncio.gather(*(self.redis.ping() for _ in range(connections)))
+            logger.info("Warmed up %s Redis connections", connections)
+            return True
+        except RedisError as e:
+            logger.error("Error warming up Redis connections: %s", e)
+            return False
 
-    async def get_redis(self) -> redis.Redis:
-        """Get a Redis connection from the pool."""
-        return redis.Redis(connection_pool=self.pool)
+    async def close(self) -> None:
+        """Disconnect all pooled connections."""
+        await self.pool.disconnect()
+        logger.info("Redis connection pool closed")
 
     async def set_json(self, key: str, data: Any, ttl: Optional[int] = None) -> bool:
         """Set a JSON value in Redis."""
         try:
-            async with await self.get_redis() as conn:
-                await conn.set(key, json.dumps(data, cls=UUIDEncoder))
-                if ttl:
-                    await conn.expire(key, ttl)
-                return True
+            await self.redis.set(key, orjson.dumps(data), ex=ttl or None)
+            return True
         except RedisError as e:
-            logger.error(f"Error setting JSON in Redis: {e}")
+            logger.error("Error setting JSON in Redis: %s", e)
             return False
 
     async def get_json(self, key: str) -> Optional[Any]:
         """Get a JSON value from Redis."""
         try:
-            async with await self.get_redis() as conn:
-                data = await conn.get(key)
-                if data:
-                    return json.loads(data)
-                return None
+            data = await self.redis.get(key)
+            if data:
+                return orjson.loads(data)
+            return None
         except RedisError as e:
-            logger.error(f"Error getting JSON from Redis: {e}")
+            logger.error("Error getting JSON from Redis: %s", e)
             return None
 
+    async def mset_json(self, mapping: Dict[str, Any], ttl: Optional[int] = None) -> bool:
+        """Set multiple JSON values in Redis in a single round-trip."""
+        if not mapping:
+            return True
+
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, data in mapping.items():
+                    pipe.set(key, orjson.dumps(data), ex=ttl or None)
+                await pipe.execute()
+            return True
+        except RedisError as e:
+            logger.error("Error setting multiple JSON values in Redis: %s", e)
+            return False
+
+    async def mget_json(self, keys: List[str]) -> List[Optional[Any]]:
+        """Get multiple JSON values from Redis in a single round-trip."""
+        if not keys:
+            return []
+
+        try:
+            values = await self.redis.mget(keys)
+            return [orjson.loads(value) if value else None for value in values]
+        except ResponseError as e:
+            # MGET is rejected when the keys span cluster slots, so issue the GETs concurrently
+            logger.warning("MGET failed, falling back to concurrent GETs: %s", e)
+            return await self._get_json_concurrently(keys)
+        except RedisError as e:
+            logger.error("Error getting multiple JSON values from Redis: %s", e)
+            return [None] * len(keys)
+
+    async def _get_json_concurrently(self, keys: List[str]) -> List[Optional[Any]]:
+        """Get multiple JSON values with bounded concurrent GETs."""
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_READS)
+
+        async def get_one(key: str) -> Optional[Any]:
+            async with semaphore:
+                return await self.get_json(key)
+
+        return list(await asyncio.gather(*(get_one(key) for key in keys)))
+
+    async def set_hash_fields(
+        self,
+        key: str,
+        mapping: Dict[str, str],
+        remove_fields: Optional[List[str]] = None,
+        replace: bool = False,
+    ) -> bool:
+        """Set fields of a Redis hash, optionally removing fields or replacing the whole key."""
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                if replace:
+                    pipe.delete(key)
+                if mapping:
+                    pipe.hset(key, mapping=mapping)
+                if remove_fields:
+                    pipe.hdel(key, *remove_fields)
+                await pipe.execute()
+            return True
+        except RedisError as e:
+            logger.error("Error setting hash fields in Redis: %s", e)
+            return False
+
+    async def update_hash_fields(
+        self,
+        key: str,
+        mapping: Dict[str, str],
+        remove_fields: Optional[List[str]] = None,
+        set_member: Optional[str] = None,
+        add_to: Optional[List[str]] = None,
+        remove_from: Optional[List[str]] = None,
+    ) -> bool:
+        """Atomically set and remove fields of a Redis hash, only if the hash exists.
+
+        In the same step, set_member is removed from the remove_from sets and added to the
+        add_to sets.
+        """
+        add_to = add_to or []
+        keys = [key, *add_to, *(remove_from or [])]
+
+        args = [set_member or "", len(add_to), len(mapping)]
+        for field, value in mapping.items():
+            args.extend((field, value))
+        args.extend(remove_fields or [])
+
+        try:
+            # Runs with EVALSHA, loading the script on the first NOSCRIPT error
+            return bool(await self._update_hash_script(keys=keys, args=args, client=self.redis))
+        except RedisError as e:
+            logger.error("Error updating hash fields in Redis: %s", e)
+            return False
+
+    async def set_hashes_with_set_members(
+        self, hashes: Dict[str, Dict[str, str]], set_members: Dict[str, List[str]]
+    ) -> bool:
+        """Atomically set fields of multiple hashes and add members to multiple sets."""
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                for key, mapping in hashes.items():
+                    if mapping:
+                        pipe.hset(key, mapping=mapping)
+                for key, values in set_members.items():
+                    if values:
+                        pipe.sadd(key, *values)
+                await pipe.execute()
+            return True
+        except RedisError as e:
+            logger.error("Error writing hashes and sets to Redis: %s", e)
+            return False
+
+    async def delete_with_set_members(self, key: str, set_members: Dict[str, List[str]]) -> bool:
+        """Atomically delete a key and remove members from multiple sets.
+
+        Returns whether the key existed.
+        """
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                for set_key, values in set_members.items():
+                    if values:
+                        pipe.srem(set_key, *values)
+                deleted, *_ = await pipe.execute()
+            return bool(deleted)
+        except RedisError as e:
+            logger.error("Error deleting key and set members from Redis: %s", e)
+            return False
+
+    async def get_hash(self, key: str) -> Dict[str, str]:
+        """Get all fields of a Redis hash."""
+        try:
+            return await self.redis.hgetall(key)
+        except RedisError as e:
+            logger.error("Error getting hash from Redis: %s", e)
+            return {}
+
+    async def get_hash_many(self, keys: List[str]) -> List[Dict[str, str]]:
+        """Get all fields of multiple Redis hashes in a single round-trip."""
+        if not keys:
+            return []
+
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.hgetall(key)
+                results = await pipe.execute(raise_on_error=False)
+            return [result if isinstance(result, dict) else {} for result in results]
+        except RedisError as e:
+            logger.error("Error getting multiple hashes from Redis: %s", e)
+            return [{} for _ in keys]
+
     async def delete(self, key: str) -> bool:
-        """Delete a key from Redis."""
+        """Delete a key from Redis, returning whether it existed."""
         try:
-            async with await self.get_redis() as conn:
-                await conn.delete(key)
-                return True
+            return bool(await self.redis.delete(key))
         except RedisError as e:
-            logger.error(f"Error deleting key from Redis: {e}")
+            logger.error("Error deleting key from Redis: %s", e)
             return False
 
+    async def delete_many(self, keys: List[str]) -> int:
+        """Delete multiple keys from Redis in a single round-trip, returning how many existed."""
+        if not keys:
+            return 0
+
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.delete(key)
+                return sum(await pipe.execute())
+        except RedisError as e:
+            logger.error("Error deleting keys from Redis: %s", e)
+            return 0
+
     async def exists(self, key: str) -> bool:
         """Check if a key exists in Redis."""
         try:
-            async with await self.get_redis() as conn:
-                return bool(await conn.exists(key))
+            return bool(await self.redis.exists(key))
         except RedisError as e:
-            logger.error(f"Error checking key existence in Redis: {e}")
+            logger.error("Error checking key existence in Redis: %s", e)
             return False
 
     async def keys(self, pattern: str) -> List[str]:
-        """Get keys matching a pattern."""
+        """Get keys matching a pattern, scanning incrementally so Redis is never blocked."""
         try:
-            async with await self.get_redis() as conn:
-                keys = await conn.keys(pattern)
-                return [k.decode("utf-8") for k in keys]
+            # SCAN may return a key more than once, so duplicates are dropped
+            keys = {}
+            async for key in self.redis.scan_iter(match=pattern, count=SCAN_COUNT):
+                keys[key] = None
+            return list(keys)
         except RedisError as e:
-            logger.error(f"Error getting keys from Redis: {e}")
+            logger.error("Error getting keys from Redis: %s", e)
             return []
 
     async def add_to_set(self, key: str, *values: str) -> int:
         """Add values to a Redis set."""
         try:
-            async with await self.get_redis() as conn:
-                return await conn.sadd(key, *values)
+            return await self.redis.sadd(key, *values)
         except RedisError as e:
-            logger.error(f"Error adding to set in Redis: {e}")
+            logger.error("Error adding to set in Redis: %s", e)
             return 0
 
     async def get_set_members(self, key: str) -> Set[str]:
         """Get all members of a Redis set."""
         try:
-            async with await self.get_redis() as conn:
-                members = await conn.smembers(key)
-                return {m.decode("utf-8") for m in members}
+            return await self.redis.smembers(key)
         except RedisError as e:
-            logger.error(f"Error getting set members from Redis: {e}")
+            logger.error("Error getting set members from Redis: %s", e)
+            return set()
+
+    async def get_sets_union(self, keys: List[str]) -> Set[str]:
+        """Get the members of the union of multiple Redis sets."""
+        try:
+            return await self.redis.sunion(keys)
+        except RedisError as e:
+            logger.error("Error getting set union from Redis: %s", e)
             return set()
 
     async def remove_from_set(self, key: str, *values: str) -> int:
         """Remove values from a Redis set."""
         try:
-            async with await self.get_redis() as conn:
-                return await conn.srem(key, *values)
+            return await self.redis.srem(key, *values)
         except RedisError as e:
-            logger.error(f"Error removing from set in Redis: {e}")
+            logger.error("Error removing from set in Redis: %s", e)
             return 0
+
+    async def get_set_sizes(self, keys: List[str]) -> List[int]:
+        """Get the number of members of multiple Redis sets in a single round-trip."""
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.scard(key)
+                return await pipe.execute()
+        except RedisError as e:
+            logger.error("Error getting set sizes from Redis: %s", e)
+            return [0] * len(keys)
+
+    async def update_sets(self, added: Dict[str, List[str]], removed: Dict[str, List[str]]) -> bool:
+        """Atomically add values to and remove values from multiple Redis sets."""
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                for key, values in removed.items():
+                    if values:
+                        pipe.srem(key, *values)
+                for key, values in added.items():
+                    if values:
+                        pipe.sadd(key, *values)
+                await pipe.execute()
+            return True
+        except RedisError as e:
+            logger.error("Error updating sets in Redis: %s", e)
+            return False
+
+
+def get_redis_client(redis_url: Optional[str] = None) -> RedisClient:
+    """Get the shared RedisClient for a Redis URL, creating it on first use."""
+    # The URL is resolved first, so that the default and an explicit URL share one client
+    return _get_redis_client(redis_url or os.getenv("REDIS_URL", DEFAULT_REDIS_URL))
+
+
+@lru_cache(maxsize=None)
+def _get_redis_client(redis_url: str) -> RedisClient:
+    """Create the RedisClient for a resolved Redis URL."""
+    return RedisClient(redis_url)
@@ -2,12 +2,12 @@
 Integration tests for position repository.
 """
 
-from unittest.mock import patch, MagicMock
+import os
 from uuid import UUID
 
-import fakeredis.aioredis
 import pytest
 import pytest_asyncio
+from redis.exceptions import ConnectionError
 
 from src.positions.models import (
     Position,
@@ -19,27 +19,30 @@ from src.positions.models import (
 from src.positions.repository import PositionRepository
 from src.storage.redis_client import RedisClient
 
+# A dedicated database, since every test flushes it
+TEST_REDIS_URL = os.getenv("TEST_REDIS_URL", "redis://localhost:6379/15")
+
 
 @pytest_asyncio.fixture
 async def redis_client():
-    """Fixture for RedisClient with fakeredis."""
-    # Use fakeredis for testing
-    fake_redis = fakeredis.aioredis.FakeRedis()
+    """Fixture for RedisClient connected to a real Redis server."""
+    client = RedisClient(TEST_REDIS_URL)
+    try:
+        await client.redis.ping()
+    except ConnectionError:
+        await client.close()
+        pytest.skip(f"Redis is not available at {TEST_REDIS_URL}")
 
-    with patch("redis.asyncio.Redis", return_value=fake_redis):
-        with patch("redis.asyncio.ConnectionPool.from_url", return_value=MagicMock()):
-            client = RedisClient("redis://fakehost:6379/0")
-            # Override get_redis to return our fake redis
-            client.get_redis = MagicMock(return_value=fake_redis)
-            yield client
+    yield client
 
-            # Clean up
-            await fake_redis.flushall()
+    # Clean up
+    await client.redis.flushdb()
+    await client.close()
 
 
 @pytest_asyncio.fixture
 async def position_repository(redis_client):
-    """Fixture for PositionRepository with fake Redis."""
+    """Fixture for PositionRepository backed by Redis."""
     return PositionRepository(redis_client)
 
 
@@ -77,6 +80,31 @@ class TestPositionRepository:
         assert position.stop_loss == sample_position_data.stop_loss
         assert position.status == PositionStatus.ACTIVE
 
+    @pytest.mark.asyncio
+    async def test_create_positions(self, position_repository, sample_position_data):
+        """Test creating multiple positions at once."""
+        eth_position_data = sample_position_data.model_copy(update={"symbol": "ETHUSDT"})
+
+        positions = await position_repository.create_positions(
+            [sample_position_data, eth_position_data]
+        )
+        assert [p.symbol for p in positions] == ["BTCUSDT", "ETHUSDT"]
+
+        # Verify positions are stored and indexed
+        for position in positions:
+            retrieved = await position_repository.get_position(position.id)
+            assert retrieved == position
+
+        user_positions = await position_repository.get_user_active_positions(
+            sample_position_data.user_id, sample_position_data.platform
+        )
+        assert {p.id for p in user_positions} == {p.id for p in positions}
+
+        eth_position = await position_repository.get_user_active_position_by_symbol(
+            sample_position_data.user_id, sample_position_data.platform, "ethusdt"
+        )
+        assert eth_position.id == positions[1].id
+
     @pytest.mark.asyncio
     async def test_get_position(self, position_repository, sample_position_data):
         """Test getting a position by ID."""
@@ -98,6 +126,41 @@ class TestPositionRepository:
         )
         assert position is None
 
+    @pytest.mark.asyncio
+    async def test_get_position_cache(
+        self, position_repository, redis_client, sample_position_data
+    ):
+        """Test that positions are served from the in-process cache until invalidated."""
+        created_position = await position_repository.create_position(sample_position_data)
+        position_key = position_repository._get_position_key(created_position.id)
+
+        # Populate the cache, then change the stored position behind the repository's back
+        await position_repository.get_position(created_position.id)
+        await redis_client.set_hash_fields(position_key, {"notes": "Changed"})
+
+        position = await position_repository.get_position(created_position.id)
+        assert position.notes is None
+
+        # Mutating a returned position leaves the cached copy untouched
+        position.metadata["changed"] = True
+        position = await position_repository.get_position(created_position.id)
+        assert position.metadata == {}
+
+        # Deleting through the repository invalidates the cached position
+        assert await position_repository.delete_position(created_position.id) is True
+        assert await position_repository.get_position(created_position.id) is None
+
+    @pytest.mark.asyncio
+    async def test_delete_position_deleted_elsewhere(
+        self, position_repository, redis_client, sample_position_data
+    ):
+        """Test that deleting a cached position another worker already deleted reports False."""
+        created_position = await position_repository.create_position(sample_position_data)
+        await position_repository.get_position(created_position.id)
+
+        assert await PositionRepository(redis_client).delete_position(created_position.id) is True
+        assert await position_repository.delete_position(created_position.id) is False
+
     @pytest.mark.asyncio
     async def test_update_position(self, position_repository, sample_position_data):
         """Test updating a position."""
@@ -128,6 +191,64 @@ class TestPositionRepository:
         position = await position_repository.get_position(created_position.id)
         assert position.entry_price == 51000.0
 
+    @pytest.mark.asyncio
+    async def test_update_position_clears_field(self, position_repository, sample_position_data):
+        """Test that setting a field to None removes it from storage."""
+        from src.positions.models import PositionUpdate
+
+        created_position = await position_repository.create_position(sample_position_data)
+
+        await position_repository.update_position(
+            created_position.id, PositionUpdate(take_profit=None, notes="Moved stop")
+        )
+
+        position = await position_repository.get_position(created_position.id)
+        assert position.take_profit is None
+        assert position.notes == "Moved stop"
+        assert position.stop_loss == sample_position_data.stop_loss
+
+    @pytest.mark.asyncio
+    async def test_update_position_keeps_unchanged_closed_at(
+        self, position_repository, sample_position_data
+    ):
+        """Test that an update only writes closed_at when it changes."""
+        from src.positions.models import PositionUpdate
+
+        created_position = await position_repository.create_position(sample_position_data)
+        closed_position = await position_repository.close_position(created_position.id)
+
+        # A second repository whose cache still holds the position as active
+        stale_repository = PositionRepository(position_repository.redis)
+        stale_repository._cache[str(created_position.id)] = created_position
+
+        await stale_repository.update_position(created_position.id, PositionUpdate(notes="Late"))
+
+        position_data = await position_repository.redis.get_hash(
+            position_repository._get_position_key(created_position.id)
+        )
+        assert position_data["closed_at"] == closed_position.closed_at.isoformat()
+        assert position_data["notes"] == "Late"
+
+    @pytest.mark.asyncio
+    async def test_get_legacy_json_position(
+        self, position_repository, redis_client, sample_position_data
+    ):
+        """Test reading and migrating a position stored in the legacy JSON layout."""
+        legacy_position = Position(
+            **sample_position_data.model_dump(exclude={"metadata"}), metadata={"source": "chart"}
+        )
+        position_key = position_repository._get_position_key(legacy_position.id)
+        await redis_client.set_json(position_key, legacy_position.model_dump(mode="json"))
+
+        # Read the legacy position
+        position = await position_repository.get_position(legacy_position.id)
+        assert position == legacy_position
+
+        # It should now be stored as a hash
+        position_data = await redis_client.get_hash(position_key)
+        assert position_data["symbol"] == sample_position_data.symbol
+        assert Position.from_hash(position_data) == legacy_position
+
     @pytest.mark.asyncio
     async def test_stop_position(self, position_repository, sample_position_data):
         """Test stopping a position."""
@@ -158,12 +279,26 @@ class TestPositionRepository:
         assert closed_position is not None
         assert closed_position.status == PositionStatus.CLOSED
         assert closed_position.closed_at is not None
+        assert closed_position.updated_at == closed_position.closed_at
 
         # Fetch position again to ensure persistence
         position = await position_repository.get_position(created_position.id)
         assert position.status == PositionStatus.CLOSED
         assert position.closed_at is not None
 
+    @pytest.mark.asyncio
+    async def test_close_deleted_position(self, position_repository, sample_position_data):
+        """Test that closing a position deleted behind the cache does not recreate it."""
+        created_position = await position_repository.create_position(sample_position_data)
+        await position_repository.get_position(created_position.id)
+
+        # Delete the stored hash while the position is still cached
+        position_key = position_repository._get_position_key(created_position.id)
+        await position_repository.redis.delete(position_key)
+
+        assert await position_repository.close_position(created_position.id) is None
+        assert await position_repository.redis.exists(position_key) is False
+
     @pytest.mark.asyncio
     async def test_get_user_positions(self, position_repository, sample_position_data):
         """Test getting all positions for a user."""
@@ -213,3 +348,184 @@ class TestPositionRepository:
         # Verify we only get the active position
         assert len(active_positions) == 1
         assert active_positions[0].id == position2.id
+
+    @pytest.mark.asyncio
+    async def test_get_user_position_counts(self, position_repository, sample_position_data):
+        """Test counting a user's positions by status."""
+        position1 = await position_repository.create_position(sample_position_data)
+        position2 = await position_repository.create_position(sample_position_data)
+        await position_repository.create_position(sample_position_data)
+
+        await position_repository.stop_position(position1.id)
+        await position_repository.close_position(position2.id)
+
+        counts = await position_repository.get_user_position_counts(
+            sample_position_data.user_id, sample_position_data.platform
+        )
+        assert counts == {
+            PositionStatus.ACTIVE: 1,
+            PositionStatus.CLOSED: 1,
+            PositionStatus.STOPPED: 1,
+        }
+
+        # Deleting a position removes it from the counts
+        await position_repository.delete_position(position1.id)
+
+        counts = await position_repository.get_user_position_counts(
+            sample_position_data.user_id, sample_position_data.platform
+        )
+        assert counts[PositionStatus.STOPPED] == 0
+
+    @pytest.mark.asyncio
+    async def test_status_sets_are_rebuilt(
+        self, position_repository, redis_client, sample_position_data
+    ):
+        """Test that positions missing from the status sets are indexed on read."""
+        position = await position_repository.create_position(sample_position_data)
+        await position_repository.stop_position(position.id)
+        active_position = await position_repository.create_position(sample_position_data)
+
+        # Simulate positions created before the status sets existed
+        user_id, platform = sample_position_data.user_id, sample_position_data.platform
+        await redis_client.delete(position_repository._get_user_indexed_key(user_id, platform))
+        for status in PositionStatus:
+            await redis_client.delete(
+                position_repository._get_user_status_key(user_id, platform, status)
+            )
+
+        position_repository = PositionRepository(redis_client)
+        active_positions = await position_repository.get_user_active_positions(
+            sample_position_data.user_id, sample_position_data.platform
+        )
+        assert [p.id for p in active_positions] == [active_position.id]
+
+        counts = await position_repository.get_user_position_counts(
+            sample_position_data.user_id, sample_position_data.platform
+        )
+        assert counts[PositionStatus.STOPPED] == 1
+
+    @pytest.mark.asyncio
+    async def test_status_sets_rebuild_keeps_concurrent_positions(
+        self, position_repository, redis_client, sample_position_data
+    ):
+        """Test that a position created while the status sets are rebuilt stays indexed."""
+        user_id, platform = sample_position_data.user_id, sample_position_data.platform
+        position1 = await position_repository.create_position(sample_position_data)
+        await redis_client.delete(position_repository._get_user_indexed_key(user_id, platform))
+
+        # Another worker creates a position after the rebuild has loaded the stored ones
+        rebuilding_repository = PositionRepository(redis_client)
+        load_positions = rebuilding_repository.get_user_positions
+        created = []
+
+        async def get_user_positions(*args, **kwargs):
+            positions = await load_positions(*args, **kwargs)
+            created.append(await position_repository.create_position(sample_position_data))
+            return positions
+
+        rebuilding_repository.get_user_positions = get_user_positions
+        await rebuilding_repository.get_user_position_counts(user_id, platform)
+
+        repository = PositionRepository(redis_client)
+        active_positions = await repository.get_user_active_positions(user_id, platform)
+        assert {p.id for p in active_positions} == {position1.id, created[0].id}
+
+        counts = await repository.get_user_position_counts(user_id, platform)
+        assert counts[PositionStatus.ACTIVE] == 2
+
+    @pytest.mark.asyncio
+    async def test_new_users_are_marked_indexed(
+        self, position_repository, redis_client, sample_position_data
+    ):
+        """Test that creating a user's first position marks their positions as indexed."""
+        user_id, platform = sample_position_data.user_id, sample_position_data.platform
+        indexed_key = position_repository._get_user_indexed_key(user_id, platform)
+
+        await position_repository.create_position(sample_position_data)
+        assert await redis_client.exists(indexed_key) is True
+
+        # A user with unindexed positions is left to be rebuilt on read
+        await redis_client.delete(indexed_key)
+        await PositionRepository(redis_client).create_position(sample_position_data)
+        assert await redis_client.exists(indexed_key) is False
+
+    @pytest.mark.asyncio
+    async def test_status_sets_are_rebuilt_once(
+        self, position_repository, redis_client, sample_position_data
+    ):
+        """Test that a user's status sets are only rebuilt until they are marked indexed."""
+        user_id, platform = sample_position_data.user_id, sample_position_data.platform
+        position = await position_repository.create_position(sample_position_data)
+        await position_repository.get_user_active_positions(user_id, platform)
+
+        # A position left in the wrong status set is not reported with that status
+        active_key = position_repository._get_user_status_key(
+            user_id, platform, PositionStatus.ACTIVE
+        )
+        await position_repository.stop_position(position.id)
+        await redis_client.add_to_set(active_key, str(position.id))
+
+        repository = PositionRepository(redis_client)
+        assert await repository.get_user_active_positions(user_id, platform) == []
+        assert await repository.get_user_positions(user_id, platform) == []
+        assert await redis_client.get_set_members(active_key) == {str(position.id)}
+
+    @pytest.mark.asyncio
+    async def test_get_user_active_position_by_symbol(
+        self, position_repository, sample_position_data
+    ):
+        """Test looking up a user's active position by symbol."""
+        from src.positions.models import PositionUpdate
+
+        user_id, platform = sample_position_data.user_id, sample_position_data.platform
+        position = await position_repository.create_position(sample_position_data)
+
+        found = await position_repository.get_user_active_position_by_symbol(
+            user_id, platform, "btcusdt"
+        )
+        assert found.id == position.id
+
+        # Changing the symbol moves the index entry
+        await position_repository.update_position(position.id, PositionUpdate(symbol="ETHUSDT"))
+        assert (
+            await position_repository.get_user_active_position_by_symbol(
+                user_id, platform, "BTCUSDT"
+            )
+            is None
+        )
+        found = await position_repository.get_user_active_position_by_symbol(
+            user_id, platform, "ETHUSDT"
+        )
+        assert found.id == position.id
+
+        # Closed positions are no longer indexed
+        await position_repository.close_position(position.id)
+        assert (
+            await position_repository.get_user_active_position_by_symbol(
+                user_id, platform, "ETHUSDT"
+            )
+            is None
+        )
+
+    @pytest.mark.asyncio
+    async def test_get_user_active_position_by_symbol_with_several_positions(
+        self, position_repository, redis_client, sample_position_data
+    ):
+        """Test that closing one of several positions in a symbol keeps the others indexed."""
+        user_id, platform = sample_position_data.user_id, sample_position_data.platform
+        position1 = await position_repository.create_position(sample_position_data)
+        position2 = await position_repository.create_position(sample_position_data)
+
+        await position_repository.close_position(position2.id)
+
+        found = await position_repository.get_user_active_position_by_symbol(
+            user_id, platform, "BTCUSDT"
+        )
+        assert found.id == position1.id
+
+        symbol_key = position_repository._get_user_symbol_key(user_id, platform, "BTCUSDT")
+        assert await redis_client.get_set_members(symbol_key) == {str(position1.id)}
+
+        # Deleting the last one empties the symbol set
+        await position_repository.delete_position(position1.id)
+        assert await redis_client.get_set_members(symbol_key) == set()
@@ -0,0 +1,35 @@
+import asyncio
+
+from fastapi import FastAPI
+from starlette.requests import Request
+
+from src.positions.service import PositionService
+from src.routes.positions.router import get_position_service
+
+
+class TestGetPositionService:
+    """Tests for the position service dependency."""
+
+    def test_is_async(self):
+        """Test that the dependency stays async so it never runs in the threadpool."""
+        assert asyncio.iscoroutinefunction(get_position_service)
+
+    def test_returns_shared_service(self):
+        """Test that every request gets the same service."""
+        app = FastAPI()
+        app.state.position_service = PositionService()
+        request = Request({"type": "http", "app": app})
+
+        assert asyncio.run(get_position_service(request)) is app.state.position_service
+        assert asyncio.run(get_position_service(request)) is app.state.position_service
+
+    def test_defaults_to_process_service(self):
+        """Test that apps without the lifespan share the process-wide service with the bots."""
+        from src.bots.utils import position_utils
+        from src.positions.service import get_position_service as get_process_service
+
+        request = Request({"type": "http", "app": FastAPI()})
+
+        service = asyncio.run(get_position_service(request))
+        assert service is get_process_service()
+        assert service is position_utils.position_service
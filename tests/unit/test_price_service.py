@@ -0,0 +1,193 @@
+import asyncio
+
+import fakeredis.aioredis
+import orjson
+import pytest
+import pytest_asyncio
+
+from src.market_data import price_service
+
+# CoinMarketCap IDs known to the fake ID map
+CMC_IDS = {"BTC": 1, "ETH": 1027}
+
+# Quotes served by the fake API, including a symbol the ID map does not know
+CMC_PRICES = {"BTC": 40000.0, "ETH": 2000.0, "NEW": 1.5}
+
+
+def _crypto_data(symbol: str) -> dict:
+    """Build CoinMarketCap quote data for a symbol."""
+    return {
+        "id": CMC_IDS.get(symbol),
+        "symbol": symbol,
+        "name": f"{symbol} Coin",
+        "quote": {
+            "USD": {
+                "price": CMC_PRICES[symbol],
+                "percent_change_1h": 0.5,
+                "percent_change_24h": 1.0,
+                "percent_change_7d": 2.0,
+                "market_cap": 1000000.0,
+                "volume_24h": 50000.0,
+                "last_updated": "2026-01-01T00:00:00.000Z",
+            }
+        },
+    }
+
+
+class FakeResponse:
+    """Response of the fake CoinMarketCap session."""
+
+    def __init__(self, data: dict):
+        self.status = 200
+        self._body = orjson.dumps({"data": data})
+
+    async def __aenter__(self):
+        # Yield to the event loop like a real request would
+        await asyncio.sleep(0.01)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def text(self) -> str:
+        return self._body.decode()
+
+
+class FakeSession:
+    """Fake CoinMarketCap session recording the requests it receives."""
+
+    def __init__(self):
+        self.requests = []
+
+    def get(self, url: str, params: dict) -> FakeResponse:
+        endpoint = url.removeprefix(price_service.CMC_API_URL)
+        self.requests.append((endpoint, params))
+
+        if endpoint == "/map":
+            symbols = params["symbol"].split(",")
+            return FakeResponse(
+                [
+                    {"id": CMC_IDS[symbol], "symbol": symbol, "rank": 1}
+                    for symbol in symbols
+                    if symbol in CMC_IDS
+                ]
+            )
+
+        # Quotes requested by ID are keyed by ID, the others by symbol
+        if "id" in params:
+            symbols_by_id = {str(cmc_id): symbol for symbol, cmc_id in CMC_IDS.items()}
+            return FakeResponse(
+                {cmc_id: _crypto_data(symbols_by_id[cmc_id]) for cmc_id in params["id"].split(",")}
+            )
+
+        return FakeResponse(
+            {
+                symbol: _crypto_data(symbol)
+                for symbol in params["symbol"].split(",")
+                if symbol in CMC_PRICES
+            }
+        )
+
+    def endpoints(self) -> list:
+        return [endpoint for endpoint, _ in self.requests]
+
+
+@pytest_asyncio.fixture
+async def cmc_session(monkeypatch):
+    """Fixture for a fake CoinMarketCap session, with prices cached in fakeredis."""
+    fake_redis = fakeredis.aioredis.FakeRedis(decode_responses=True, protocol=3)
+    session = FakeSession()
+
+    async def get_session():
+        return session
+
+    monkeypatch.setattr(price_service.redis_client, "redis", fake_redis)
+    monkeypatch.setattr(price_service, "CMC_API_KEY", "test-key")
+    monkeypatch.setattr(price_service, "_get_session", get_session)
+    await price_service.clear_price_cache()
+
+    yield session
+
+    # Clean up
+    await price_service.clear_price_cache()
+    await fake_redis.flushall()
+
+
+class TestPriceService:
+    """Tests for the CoinMarketCap price service."""
+
+    @pytest.mark.asyncio
+    async def test_quotes_are_requested_by_id(self, cmc_session):
+        """Test that symbols are resolved to IDs and quotes are matched by ID or symbol."""
+        prices = await price_service.get_multiple_crypto_prices(["btc", "ETH", "NEW"])
+
+        assert {symbol: data["price"] for symbol, data in prices.items()} == CMC_PRICES
+        assert cmc_session.requests == [
+            ("/map", {"symbol": "BTC,ETH,NEW"}),
+            ("/quotes/latest", {"id": "1,1027", "convert": "USD"}),
+            ("/quotes/latest", {"symbol": "NEW", "convert": "USD"}),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_symbol_ids_are_cached(self, cmc_session):
+        """Test that resolved and unresolved symbols are not looked up in the ID map again."""
+        await price_service.get_multiple_crypto_prices(["BTC", "TYPO"])
+        assert cmc_session.endpoints().count("/map") == 1
+
+        # Bypass the price cache so that the prices are fetched again
+        prices = await price_service.get_multiple_crypto_prices(["BTC", "TYPO"], max_age_seconds=0)
+
+        assert list(prices) == ["BTC"]
+        assert cmc_session.endpoints().count("/map") == 1
+        assert cmc_session.requests[-1] == (
+            "/quotes/latest",
+            {"symbol": "TYPO", "convert": "USD"},
+        )
+
+        # Other workers share both the ID and the unknown symbol through Redis
+        assert await price_service.redis_client.mget_json(["cmc:id:BTC", "cmc:id:TYPO"]) == [
+            1,
+            price_service.UNRESOLVED_SYMBOL_ID,
+        ]
+
+    @pytest.mark.asyncio
+    async def test_prices_are_cached_locally_and_in_redis(self, cmc_session):
+        """Test that prices are read from the local cache, then Redis, before the API."""
+        price = await price_service.get_crypto_price("BTCUSDT")
+        assert price["price"] == CMC_PRICES["BTC"]
+        request_count = len(cmc_session.requests)
+
+        # Another worker finds the price in Redis and keeps it in its local cache
+        price_service._price_cache.clear()
+        assert await price_service.get_crypto_price("BTC") == price
+        assert "BTC:USD" in price_service._price_cache
+
+        # The local cache answers without Redis
+        await price_service.redis_client.redis.flushall()
+        assert await price_service.get_crypto_price("BTC") == price
+
+        assert len(cmc_session.requests) == request_count
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_one_fetch(self, cmc_session):
+        """Test that concurrent cache misses for a symbol make a single API request."""
+        prices = await asyncio.gather(*(price_service.get_crypto_price("ETH") for _ in range(5)))
+
+        assert [price["price"] for price in prices] == [CMC_PRICES["ETH"]] * 5
+        assert cmc_session.endpoints() == ["/map", "/quotes/latest"]
+        assert price_service._inflight == {}
+
+    @pytest.mark.asyncio
+    async def test_clear_price_cache(self, cmc_session):
+        """Test that clearing the cache also removes the prices and IDs shared through Redis."""
+        await price_service.get_crypto_price("BTC")
+        assert await price_service.redis_client.keys("*") != []
+
+        await price_service.clear_price_cache()
+
+        assert await price_service.redis_client.keys("*") == []
+        await price_service.get_crypto_price("BTC")
+        assert cmc_session.endpoints() == ["/map", "/quotes/latest"] * 2
@@ -1,69 +1,36 @@
-import json
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
+from uuid import UUID
 
 import fakeredis.aioredis
 import pytest
 import pytest_asyncio
 
-from src.storage.redis_client import RedisClient, UUIDEncoder
-
-
-@pytest.fixture
-def uuid_encoder():
-    """Fixture for UUID encoder instance."""
-    return UUIDEncoder()
-
-
-class TestUUIDEncoder:
-    """Tests for UUIDEncoder class."""
-
-    def test_encode_uuid(self, uuid_encoder):
-        """Test encoding UUID to string."""
-        from uuid import UUID
-
-        test_uuid = UUID("12345678-1234-5678-1234-567812345678")
-
-        # Test encoding with UUIDEncoder
-        encoded = json.dumps(test_uuid, cls=UUIDEncoder)
-
-        # Should be a JSON string with the UUID as string
-        assert encoded == '"12345678-1234-5678-1234-567812345678"'
-
-    def test_encode_dict_with_uuid(self, uuid_encoder):
-        """Test encoding dictionary containing UUID."""
-        from uuid import UUID
-
-        test_uuid = UUID("12345678-1234-5678-1234-567812345678")
-        test_dict = {"id": test_uuid, "name": "test"}
-
-        # Test encoding with UUIDEncoder
-        encoded = json.dumps(test_dict, cls=UUIDEncoder)
-
-        # Should be a JSON string with UUID converted to string
-        expected = '{"id": "12345678-1234-5678-1234-567812345678", "name": "test"}'
-        assert json.loads(encoded) == json.loads(expected)
+from src.storage.redis_client import RedisClient, get_redis_client
 
 
 @pytest_asyncio.fixture
 async def redis_client():
     """Fixture for RedisClient with fakeredis."""
     # Use fakeredis for testing
-    fake_redis = fakeredis.aioredis.FakeRedis()
+    fake_redis = fakeredis.aioredis.FakeRedis(decode_responses=True, protocol=3)
 
-    with patch("redis.asyncio.Redis", return_value=fake_redis):
-        with patch("redis.asyncio.ConnectionPool.from_url", return_value=MagicMock()):
-            client = RedisClient("redis://fakehost:6379/0")
-            # Override get_redis to return our fake redis
-            client.get_redis = MagicMock(return_value=fake_redis)
-            yield client
+    client = RedisClient("redis://fakehost:6379/0")
+    # Use our fake redis as the shared client
+    client.redis = fake_redis
+    yield client
 
-            # Clean up
-            await fake_redis.flushall()
+    # Clean up
+    await fake_redis.flushall()
 
 
 class TestRedisClient:
     """Tests for RedisClient class."""
 
+    @pytest.mark.asyncio
+    async def test_warm_up(self, redis_client):
+        """Test warming up pooled connections."""
+        assert await redis_client.warm_up(connections=3) is True
+
     @pytest.mark.asyncio
     async def test_set_get_json(self, redis_client):
         """Test setting and getting JSON data."""
@@ -79,6 +46,119 @@ class TestRedisClient:
         retrieved = await redis_client.get_json(key)
         assert retrieved == data
 
+    @pytest.mark.asyncio
+    async def test_set_json_with_uuid(self, redis_client):
+        """Test that UUIDs are serialized as strings."""
+        test_uuid = UUID("12345678-1234-5678-1234-567812345678")
+
+        await redis_client.set_json("uuid_key", {"id": test_uuid, "name": "test"})
+
+        retrieved = await redis_client.get_json("uuid_key")
+        assert retrieved == {"id": "12345678-1234-5678-1234-567812345678", "name": "test"}
+
+    @pytest.mark.asyncio
+    async def test_set_json_with_ttl(self, redis_client):
+        """Test setting JSON data with an expiry."""
+        result = await redis_client.set_json("ttl_key", {"value": 1}, ttl=60)
+        assert result is True
+
+        fake_redis = redis_client.redis
+        assert 0 < await fake_redis.ttl("ttl_key") <= 60
+        assert await redis_client.get_json("ttl_key") == {"value": 1}
+
+    @pytest.mark.asyncio
+    async def test_mset_mget_json(self, redis_client):
+        """Test setting and getting multiple JSON values at once."""
+        # Set up test data
+        result = await redis_client.mset_json({"many:1": {"id": 1}, "many:2": {"id": 2}}, ttl=60)
+        assert result is True
+        assert 0 < await redis_client.redis.ttl("many:1") <= 60
+
+        # Get the data, including a missing key
+        retrieved = await redis_client.mget_json(["many:1", "missing", "many:2"])
+        assert retrieved == [{"id": 1}, None, {"id": 2}]
+
+        # An empty key list should not hit Redis
+        assert await redis_client.mget_json([]) == []
+
+    @pytest.mark.asyncio
+    async def test_mget_json_without_mget(self, redis_client):
+        """Test falling back to individual GETs when MGET is rejected."""
+        from redis.exceptions import ResponseError
+
+        await redis_client.set_json("many:1", {"id": 1})
+        await redis_client.set_json("many:2", {"id": 2})
+
+        fake_redis = redis_client.redis
+        with patch.object(fake_redis, "mget", side_effect=ResponseError("CROSSSLOT")):
+            retrieved = await redis_client.mget_json(["many:1", "missing", "many:2"])
+
+        assert retrieved == [{"id": 1}, None, {"id": 2}]
+
+    @pytest.mark.asyncio
+    async def test_hash_operations(self, redis_client):
+        """Test setting, removing and getting hash fields."""
+        key = "test_hash"
+
+        # Set fields
+        result = await redis_client.set_hash_fields(key, {"status": "active", "notes": "hi"})
+        assert result is True
+        assert await redis_client.get_hash(key) == {"status": "active", "notes": "hi"}
+
+        # Update one field and remove another
+        await redis_client.set_hash_fields(key, {"status": "closed"}, remove_fields=["notes"])
+        assert await redis_client.get_hash(key) == {"status": "closed"}
+
+        # Replace the whole hash
+        await redis_client.set_hash_fields(key, {"symbol": "BTC"}, replace=True)
+        assert await redis_client.get_hash(key) == {"symbol": "BTC"}
+
+        # Missing hashes are empty
+        assert await redis_client.get_hash("missing") == {}
+
+    @pytest.mark.asyncio
+    async def test_update_hash_fields(self, redis_client):
+        """Test updating fields of a hash only when it exists."""
+        await redis_client.set_hash_fields("hash", {"field1": "value1", "field2": "value2"})
+
+        result = await redis_client.update_hash_fields("hash", {"field1": "new"}, ["field2"])
+        assert result is True
+        assert await redis_client.get_hash("hash") == {"field1": "new"}
+
+        # Move a member between sets together with the update
+        await redis_client.add_to_set("active", "hash")
+        await redis_client.add_to_set("symbol:BTC", "hash")
+        result = await redis_client.update_hash_fields(
+            "hash",
+            {"status": "closed"},
+            set_member="hash",
+            add_to=["closed"],
+            remove_from=["active", "symbol:BTC"],
+        )
+        assert result is True
+        assert await redis_client.get_hash("hash") == {"field1": "new", "status": "closed"}
+        assert await redis_client.get_set_members("active") == set()
+        assert await redis_client.get_set_members("symbol:BTC") == set()
+        assert await redis_client.get_set_members("closed") == {"hash"}
+
+        # A missing hash is not created and its sets are left alone
+        result = await redis_client.update_hash_fields(
+            "missing", {"field1": "value1"}, set_member="missing", add_to=["closed"]
+        )
+        assert result is False
+        assert await redis_client.exists("missing") is False
+        assert await redis_client.get_set_members("closed") == {"hash"}
+
+    @pytest.mark.asyncio
+    async def test_get_hash_many(self, redis_client):
+        """Test getting multiple hashes at once."""
+        await redis_client.set_hash_fields("hash:1", {"id": "1"})
+        await redis_client.set_hash_fields("hash:2", {"id": "2"})
+        await redis_client.set_json("json:1", {"id": 3})
+
+        retrieved = await redis_client.get_hash_many(["hash:1", "missing", "json:1", "hash:2"])
+        assert retrieved == [{"id": "1"}, {}, {}, {"id": "2"}]
+
     @pytest.mark.asyncio
     async def test_delete(self, redis_client):
         """Test deleting a key."""
@@ -99,6 +179,15 @@ class TestRedisClient:
         # Verify it's gone
         assert await redis_client.exists(key) is False
 
+        # Deleting a missing key reports that nothing was deleted
+        assert await redis_client.delete(key) is False
+
+        # Delete several keys at once
+        await redis_client.set_json("test_delete:1", data)
+        await redis_client.set_json("test_delete:2", data)
+        assert await redis_client.delete_many(["test_delete:1", "test_delete:2", key]) == 2
+        assert await redis_client.keys("test_delete*") == []
+
     @pytest.mark.asyncio
     async def test_keys(self, redis_client):
         """Test getting keys matching a pattern."""
@@ -147,3 +236,73 @@ class TestRedisClient:
         # Get final members
         members = await redis_client.get_set_members(set_key)
         assert members == {"value2", "value3"}
+
+    @pytest.mark.asyncio
+    async def test_set_membership_operations(self, redis_client):
+        """Test updating and counting set members."""
+        await redis_client.add_to_set("active", "value1", "value2")
+
+        # Swap members of a set
+        await redis_client.update_sets(
+            {"active": ["value3", "value4"]}, {"active": ["value1", "value2"]}
+        )
+        assert await redis_client.get_set_members("active") == {"value3", "value4"}
+
+        # Count members
+        sizes = await redis_client.get_set_sizes(["active", "closed", "missing"])
+        assert sizes == [2, 0, 0]
+
+        # Remove members
+        await redis_client.add_to_set("active", "value5")
+        await redis_client.add_to_set("closed", "value1", "value2")
+        await redis_client.update_sets({}, {"active": ["value3", "value4"], "closed": ["value1"]})
+        assert await redis_client.get_set_members("active") == {"value5"}
+        assert await redis_client.get_set_members("closed") == {"value2"}
+
+        # Get the union of several sets
+        assert await redis_client.get_sets_union(["active", "closed", "missing"]) == {
+            "value5",
+            "value2",
+        }
+
+        # Add to and remove from several sets at once
+        await redis_client.update_sets({"closed": ["value6"]}, {"active": ["value5"]})
+        assert await redis_client.get_set_sizes(["active", "closed"]) == [0, 2]
+
+    @pytest.mark.asyncio
+    async def test_set_hashes_with_set_members(self, redis_client):
+        """Test writing multiple hashes and sets in one transaction."""
+        result = await redis_client.set_hashes_with_set_members(
+            {"hash1": {"field": "value1"}, "hash2": {"field": "value2"}, "empty": {}},
+            {"set1": ["hash1", "hash2"], "set2": []},
+        )
+        assert result is True
+
+        assert await redis_client.get_hash("hash1") == {"field": "value1"}
+        assert await redis_client.get_hash("hash2") == {"field": "value2"}
+        assert await redis_client.exists("empty") is False
+        assert await redis_client.get_set_members("set1") == {"hash1", "hash2"}
+
+    @pytest.mark.asyncio
+    async def test_delete_with_set_members(self, redis_client):
+        """Test deleting a key together with its set memberships."""
+        await redis_client.set_hash_fields("hash1", {"field": "value1"})
+        await redis_client.add_to_set("set1", "hash1", "hash2")
+        await redis_client.add_to_set("set2", "hash1")
+
+        members = {"set1": ["hash1"], "set2": ["hash1"]}
+        assert await redis_client.delete_with_set_members("hash1", members) is True
+        assert await redis_client.exists("hash1") is False
+        assert await redis_client.get_set_members("set1") == {"hash2"}
+        assert await redis_client.exists("set2") is False
+
+        # Deleting a missing key reports that nothing was deleted
+        assert await redis_client.delete_with_set_members("hash1", members) is False
+
+    def test_get_redis_client_is_shared_per_url(self):
+        """Test that the factory returns one client per resolved Redis URL."""
+        with patch.dict("os.environ", {"REDIS_URL": "redis://fakehost:6379/3"}):
+            client = get_redis_client()
+            assert get_redis_client(None) is client
+            assert get_redis_client("redis://fakehost:6379/3") is client
+            assert get_redis_client("redis://fakehost:6379/4") is not client